@@ -34,6 +34,13 @@ WS_URI = f"ws://{WS_HOST}:{WS_PORT}"
 # 鉴权 Token (必须与 napcat.json 中的 token 一致)
 TOKEN = "你的token"
 
+# 是否启用 permessage-deflate 压缩（本机/内网部署建议关闭，节省 CPU；跨公网带宽紧张时可开启）
+WS_COMPRESSION = False
+
+# 单帧最大字节数 (超出会断开连接) 与接收缓冲帧数
+WS_MAX_SIZE = 4 * 1024 * 1024
+WS_MAX_QUEUE = 64
+
 # ==================== 功能配置 ====================
 # 图片下载最大并发数
 MAX_DOWNLOAD_CONCURRENCY = 5
@@ -58,6 +65,31 @@ STOP_WORDS = {
     "图片", "表情", "动画表情"
 }
 
+# ==================== 消息写入配置 ====================
+# 消息先进入内存队列，由后台任务攒批后在一个事务中写入数据库
+WRITE_QUEUE_SIZE = 10000       # 队列上限，写满时丢弃新消息
+WRITE_BATCH_SIZE = 500         # 单批最多写入条数
+WRITE_FLUSH_INTERVAL = 1.0     # 最长等待时间（秒），到时即使未满也写入
+
+# ==================== 可视化配置 ====================
+# 发言排行、24小时活跃度使用 Pillow 直接绘制（无需浏览器，速度快得多）
+# 设为 False 则始终使用 HTML + Playwright 渲染
+PILLOW_CHARTS = True
+
+# 启动时在后台预热浏览器渲染器；内存紧张时可关闭，首次出图时再启动浏览器
+RENDER_WARMUP = True
+
+# 热词分词子进程数（jieba 为纯 Python，子进程分词不阻塞机器人主进程），0 表示在线程中分词
+SEGMENT_WORKERS = 2
+
+# ==================== 报表缓存配置 ====================
+# 同一群同一天重复请求时直接复用已生成的图片（秒）
+STAT_CACHE_TTL = 300           # /stat 热词图
+PERIOD_CACHE_TTL = 3600        # /week、/month 周报月报
+
+# 定时日报 / 周报同时生成的群数量上限
+REPORT_CONCURRENCY = 4
+
 # ==================== 日志配置 ====================
 LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
@@ -1,12 +1,35 @@
 # -*- coding: utf-8 -*-
 """
 lib 模块初始化
+
+导出项在首次访问时才导入对应子模块，导入 lib.db_manager 等轻量模块时
+不会连带加载可视化、下载等较重的依赖
 """
 
-from .db_manager import DatabaseManager
-from .async_utils import AssetDownloader, FileHasher, RateLimiter
-from .visualizer import StatsVisualizer
-from .protocol import OneBotProtocol, MessageSegment, GroupMessage
+import importlib
+
+# 导出名 -> 所在子模块
+_EXPORTS = {
+    'DatabaseManager': '.db_manager',
+    'AssetDownloader': '.async_utils',
+    'FileHasher': '.async_utils',
+    'RateLimiter': '.async_utils',
+    'StatsVisualizer': '.visualizer',
+    'OneBotProtocol': '.protocol',
+    'MessageSegment': '.protocol',
+    'GroupMessage': '.protocol',
+    'TTLCache': '.cache',
+}
+
+
+def __getattr__(name: str):
+    """按需导入导出项"""
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
 
 __all__ = [
     'DatabaseManager',
@@ -16,5 +39,6 @@ __all__ = [
     'StatsVisualizer',
     'OneBotProtocol',
     'MessageSegment',
-    'GroupMessage'
+    'GroupMessage',
+    'TTLCache'
 ]
@@ -11,7 +11,9 @@ import asyncio
 import logging
 import time
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Iterable, Optional, Tuple
+
+from .cache import TTLCache
 
 logger = logging.getLogger("AsyncUtils")
 
@@ -214,6 +216,92 @@ class AssetDownloader:
         return None, None, None
 
 
+class AvatarCache:
+    """QQ 头像缓存（内存 LRU + 磁盘持久化，默认 24 小时过期）"""
+    
+    AVATAR_URL = "https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=100"
+    
+    def __init__(self, cache_dir: Optional[Path] = None, ttl: float = 24 * 3600,
+                 max_memory: int = 256, max_concurrency: int = 5,
+                 failure_ttl: float = 600):
+        """
+        Args:
+            cache_dir: 磁盘缓存目录，为 None 时只缓存在内存
+            ttl: 过期时间（秒）
+            max_memory: 内存中最多缓存的头像数
+            max_concurrency: 最大并发下载数
+            failure_ttl: 下载失败的记录保留时间（秒），期间直接返回 None 使用占位图，
+                         避免头像服务不可用时每次出图都等待下载超时
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=max_memory, ttl=ttl)
+        self._failed = TTLCache(maxsize=1024, ttl=failure_ttl)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.timeout = aiohttp.ClientTimeout(total=10, connect=5)
+    
+    def _disk_path(self, user_id: int) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / f"{user_id}.jpg"
+    
+    def _read_disk(self, path: Path) -> Optional[bytes]:
+        """读取未过期的磁盘缓存"""
+        try:
+            if time.time() - path.stat().st_mtime < self.ttl:
+                return path.read_bytes()
+        except OSError:
+            pass
+        return None
+    
+    def _write_disk(self, path: Path, data: bytes):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+        except OSError as e:
+            logger.debug(f"写入头像缓存失败: {e}")
+    
+    async def get(self, user_id: int) -> Optional[bytes]:
+        """获取头像图片，依次查询内存、磁盘、网络"""
+        data = self._memory.get(user_id)
+        if data is not None:
+            return data
+        if user_id in self._failed:
+            return None
+        
+        path = self._disk_path(user_id)
+        if path is not None:
+            data = await asyncio.to_thread(self._read_disk, path)
+        
+        if data is None:
+            data = await self._download(user_id)
+            if data is None:
+                self._failed.set(user_id, True)
+                return None
+            if path is not None:
+                await asyncio.to_thread(self._write_disk, path, data)
+        
+        self._memory.set(user_id, data)
+        return data
+    
+    async def prefetch(self, user_ids: Iterable[int]):
+        """并发预热一批头像"""
+        await asyncio.gather(*(self.get(uid) for uid in set(user_ids)))
+    
+    async def _download(self, user_id: int) -> Optional[bytes]:
+        url = self.AVATAR_URL.format(user_id=user_id)
+        async with self.semaphore:
+            try:
+                async with aiohttp.ClientSession(timeout=self.timeout) as session:
+                    async with session.get(url) as resp:
+                        if resp.status == 200:
+                            return await resp.read()
+                        logger.debug(f"头像下载失败 {user_id}: HTTP {resp.status}")
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                logger.debug(f"头像下载失败 {user_id}: {e}")
+        return None
+
+
 class FileHasher:
     """文件哈希工具"""
     
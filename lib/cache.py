@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+缓存工具模块
+提供带过期时间的 LRU 缓存和内容哈希键生成
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from . import fastjson
+
+
+class TTLCache:
+    """带过期时间的 LRU 缓存（单线程 / 事件循环内使用）"""
+
+    def __init__(self, maxsize: int = 64, ttl: float = 300):
+        """
+        Args:
+            maxsize: 最大条目数，超出时淘汰最久未使用的条目
+            ttl: 条目存活时间（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，过期或不存在时返回 default"""
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """写入缓存"""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """移除并返回条目"""
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        """清空缓存"""
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_MISSING = object()
+
+
+def content_key(data: Any) -> bytes:
+    """
+    计算任意可 JSON 序列化数据的稳定哈希
+
+    字典按键排序，无法序列化的对象使用 str() 表示；
+    序列化直接得到字节（orjson 可用时），无需再编码
+    """
+    raw = fastjson.dumps_bytes(data, sort_keys=True, default=str)
+    return hashlib.blake2b(raw, digest_size=16).digest()
@@ -5,11 +5,15 @@
 """
 
 import logging
+import re
 from typing import Callable, Dict, List, Optional, Any
 from dataclasses import dataclass, field
 
 logger = logging.getLogger("Commands")
 
+# 参数中的 @：CQ 码或 @QQ号
+_AT_PATTERN = re.compile(r'\[CQ:at,qq=(\d+)\]|@(\d+)')
+
 
 @dataclass
 class CommandInfo:
@@ -30,6 +34,7 @@ class CommandRegistry:
         self.prefix = prefix
         self._commands: Dict[str, CommandInfo] = {}
         self._aliases: Dict[str, str] = {}  # 别名 -> 主命令名
+        self._lookup: Dict[str, CommandInfo] = {}  # 主命令名 / 别名 -> 命令信息，查找只需一次哈希
     
     @property
     def commands(self) -> Dict[str, CommandInfo]:
@@ -55,7 +60,7 @@ class CommandRegistry:
         aliases = aliases or []
         
         def decorator(func: Callable):
-            cmd_info = CommandInfo(
+            self.register(CommandInfo(
                 name=name,
                 handler=func,
                 aliases=aliases,
@@ -63,16 +68,7 @@ class CommandRegistry:
                 usage=usage,
                 category=category,
                 admin_only=admin_only
-            )
-            
-            # 注册主命令
-            self._commands[name.lower()] = cmd_info
-            
-            # 注册别名
-            for alias in aliases:
-                self._aliases[alias.lower()] = name.lower()
-            
-            logger.debug(f"注册命令: {name} (别名: {aliases})")
+            ))
             return func
         
         return decorator
@@ -80,34 +76,33 @@ class CommandRegistry:
     def register(self, cmd_info: CommandInfo):
         """直接注册命令信息对象"""
         # 注册主命令
-        self._commands[cmd_info.name.lower()] = cmd_info
+        name = cmd_info.name.lower()
+        self._commands[name] = cmd_info
         
         # 注册别名
         for alias in (cmd_info.aliases or []):
-            self._aliases[alias.lower()] = cmd_info.name.lower()
+            self._aliases[alias.lower()] = name
         
+        self._rebuild_lookup()
         logger.debug(f"注册命令: {cmd_info.name} (别名: {cmd_info.aliases})")
     
     def get(self, cmd_name: str) -> Optional[CommandInfo]:
         """获取命令信息 (get_command 的别名)"""
         return self.get_command(cmd_name)
     
+    def _rebuild_lookup(self):
+        """重建扁平查找表（主命令优先于同名别名）"""
+        lookup = {
+            alias: self._commands[name]
+            for alias, name in self._aliases.items()
+            if name in self._commands
+        }
+        lookup.update(self._commands)
+        self._lookup = lookup
+    
     def get_command(self, cmd_name: str) -> Optional[CommandInfo]:
-        """获取命令信息"""
-        cmd_name = cmd_name.lower()
-        """获取命令信息"""
-        cmd_name = cmd_name.lower()
-        
-        # 先查主命令
-        if cmd_name in self._commands:
-            return self._commands[cmd_name]
-        
-        # 再查别名
-        if cmd_name in self._aliases:
-            main_cmd = self._aliases[cmd_name]
-            return self._commands.get(main_cmd)
-        
-        return None
+        """获取命令信息（主命令或别名）"""
+        return self._lookup.get(cmd_name.lower())
     
     def parse_command(self, text: str) -> Optional[tuple]:
         """
@@ -211,10 +206,9 @@ class CommandContext:
     def get_at_users(self) -> List[int]:
         """从参数中提取 @ 的用户"""
         # 这里简化处理，实际可能需要从原始消息中解析
-        import re
         users = []
         # 匹配 QQ 号
-        for match in re.finditer(r'\[CQ:at,qq=(\d+)\]|@(\d+)', self.args):
+        for match in _AT_PATTERN.finditer(self.args):
             qq = match.group(1) or match.group(2)
             if qq:
                 users.append(int(qq))
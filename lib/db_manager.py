@@ -6,31 +6,115 @@
 """
 
 import sqlite3
-import json
 import logging
 import asyncio
+import queue
 import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Iterator
+
+from . import fastjson
 
 logger = logging.getLogger("DBManager")
 
+# 今日 0 点时间戳缓存：(今日 0 点, 明日 0 点)
+_day_bounds: Tuple[int, int] = (0, 0)
+
+
+def get_today_start() -> int:
+    """
+    本地时间今日 0 点的时间戳
+    
+    结果缓存到次日 0 点，期间无需重复调用 localtime / mktime
+    """
+    global _day_bounds
+    now = time.time()
+    start, end = _day_bounds
+    if not start <= now < end:
+        lt = time.localtime(now)
+        start = int(time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday, 0, 0, 0, 0, 0, -1)))
+        # mktime 会规范化越界日期，tm_mday + 1 即为次日 0 点（跨月、夏令时切换均正确）
+        end = int(time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday + 1, 0, 0, 0, 0, 0, -1)))
+        _day_bounds = (start, end)
+    return start
+
+# 每个连接创建时设置的 PRAGMA（journal_mode=WAL 持久保存在库文件中，初始化时设置一次）
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",      # WAL 模式下只在检查点 fsync，仍保证数据库一致
+    "PRAGMA mmap_size = 268435456",     # 256MB 内存映射读取，减少 read() 系统调用和拷贝
+    "PRAGMA cache_size = -32768",       # 每个连接 32MB 页缓存
+    "PRAGMA temp_store = MEMORY",       # GROUP BY / ORDER BY 临时表放在内存中
+)
+
 
 class DatabaseManager:
     """数据库管理器"""
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool_size: int = 4):
+        """
+        Args:
+            db_path: 数据库文件路径
+            pool_size: 空闲连接池上限（查询在线程池中执行，超出时临时创建连接并在用完后关闭）
+        """
         self.db_path = db_path
+        self.pool_size = pool_size
+        self._pool: "queue.SimpleQueue[sqlite3.Connection]" = queue.SimpleQueue()
+        self._closed = False
         # 确保数据库目录存在
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
         self._init_db()
+        self._json1_available = self._probe_json1()
+    
+    def _probe_json1(self) -> bool:
+        """检测 SQLite 是否编译了 JSON1 扩展（只在启动时检测一次）"""
+        try:
+            with self._get_connection() as conn:
+                conn.execute("SELECT json_valid('[]')").fetchone()
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite 不支持 JSON1，周报/月报文本将在 Python 中逐行解析: {e}")
+            return False
     
-    def _get_connection(self) -> sqlite3.Connection:
-        """获取数据库连接"""
+    def _connect(self) -> sqlite3.Connection:
+        """创建新连接并应用连接级 PRAGMA"""
         conn = sqlite3.connect(self.db_path, check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
         return conn
     
+    @contextmanager
+    def _get_connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        从连接池借出连接，退出时提交（异常时回滚）并归还
+        
+        连接跨线程复用（check_same_thread=False），同一时刻只被一个线程持有
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        
+        try:
+            with conn:
+                yield conn
+        finally:
+            if self._closed or self._pool.qsize() >= self.pool_size:
+                conn.close()
+            else:
+                self._pool.put(conn)
+    
+    async def close(self):
+        """关闭连接池中的所有连接"""
+        self._closed = True
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+    
     def _init_db(self):
         """初始化数据库结构，同步执行"""
         try:
@@ -123,37 +207,45 @@ class DatabaseManager:
             logger.critical(f"数据库初始化失败: {e}")
             raise
     
+    _INSERT_MESSAGE_SQL = """INSERT OR IGNORE INTO messages 
+                             (message_id, group_id, user_id, msg_type, raw_content, created_at) 
+                             VALUES (?, ?, ?, ?, ?, ?)"""
+    
+    _UPSERT_USER_SQL = """INSERT OR REPLACE INTO user_info 
+                          (user_id, nickname, last_updated) 
+                          VALUES (?, ?, ?)"""
+    
+    @staticmethod
+    def _message_row(msg_data: dict) -> tuple:
+        """将消息数据转换为 messages 表的一行"""
+        # 判断消息类型
+        message = msg_data.get('message', [])
+        msg_types = set()
+        for seg in message:
+            msg_types.add(seg.get('type', 'unknown'))
+        
+        if len(msg_types) == 1 and 'text' in msg_types:
+            msg_type = 'text'
+        elif len(msg_types) == 1 and 'image' in msg_types:
+            msg_type = 'image'
+        else:
+            msg_type = 'mixed'
+        
+        return (
+            msg_data['message_id'],
+            msg_data.get('group_id', 0),
+            msg_data['user_id'],
+            msg_type,
+            fastjson.dumps(message),
+            msg_data['time']
+        )
+    
     async def insert_message(self, msg_data: dict) -> bool:
         """异步插入消息"""
         def _insert():
             try:
                 with self._get_connection() as conn:
-                    # 判断消息类型
-                    message = msg_data.get('message', [])
-                    msg_types = set()
-                    for seg in message:
-                        msg_types.add(seg.get('type', 'unknown'))
-                    
-                    if len(msg_types) == 1 and 'text' in msg_types:
-                        msg_type = 'text'
-                    elif len(msg_types) == 1 and 'image' in msg_types:
-                        msg_type = 'image'
-                    else:
-                        msg_type = 'mixed'
-                    
-                    conn.execute(
-                        """INSERT OR IGNORE INTO messages 
-                           (message_id, group_id, user_id, msg_type, raw_content, created_at) 
-                           VALUES (?, ?, ?, ?, ?, ?)""",
-                        (
-                            msg_data['message_id'],
-                            msg_data.get('group_id', 0),
-                            msg_data['user_id'],
-                            msg_type,
-                            json.dumps(message, ensure_ascii=False),
-                            msg_data['time']
-                        )
-                    )
+                    conn.execute(self._INSERT_MESSAGE_SQL, self._message_row(msg_data))
                     conn.commit()
                     return True
             except Exception as e:
@@ -236,12 +328,7 @@ class DatabaseManager:
         """获取今日群消息用于统计"""
         def _query():
             # 计算今日0点时间戳
-            now = time.time()
-            local_time = time.localtime(now)
-            today_start = int(time.mktime(time.struct_time((
-                local_time.tm_year, local_time.tm_mon, local_time.tm_mday,
-                0, 0, 0, 0, 0, -1
-            ))))
+            today_start = get_today_start()
             
             with self._get_connection() as conn:
                 cursor = conn.cursor()
@@ -307,24 +394,63 @@ class DatabaseManager:
         
         return await asyncio.to_thread(_query)
     
+    async def get_ranking_with_names(self, group_id: int, start_time: int,
+                                     name_limit: int = 10) -> Tuple[List[Tuple], Dict[int, str]]:
+        """
+        获取群成员发言统计，并在同一条查询中关联用户昵称
+        
+        Args:
+            group_id: 群号
+            start_time: 开始时间戳
+            name_limit: 只为前 N 名生成昵称映射
+            
+        Returns:
+            (发言统计 [(user_id, count), ...] 按发言数降序, {user_id: 昵称})，
+            昵称规则与 get_users_info_batch 一致，库中没有记录的用户不包含在内
+        """
+        def _query():
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """SELECT m.user_id, m.count, u.user_id, u.nickname, u.card
+                       FROM (SELECT user_id, COUNT(*) AS count
+                             FROM messages
+                             WHERE group_id = ? AND created_at >= ?
+                             GROUP BY user_id) AS m
+                       LEFT JOIN user_info AS u ON u.user_id = m.user_id
+                       ORDER BY m.count DESC""",
+                    (group_id, start_time)
+                )
+                rows = cursor.fetchall()
+                
+                user_stats = [(row[0], row[1]) for row in rows]
+                user_names = {}
+                for row in rows[:name_limit]:
+                    if row[2] is not None:
+                        # 优先使用群名片，其次昵称
+                        user_names[row[0]] = row[4] or row[3] or str(row[0])
+                return user_stats, user_names
+        
+        return await asyncio.to_thread(_query)
+    
     async def get_hourly_message_count(self, group_id: int, 
                                        start_time: int) -> Dict[int, int]:
         """获取按小时统计的消息数量"""
         def _query():
             with self._get_connection() as conn:
                 cursor = conn.cursor()
+                # 在 SQLite 内按本地时间小时聚合，只返回 24 行以内的结果
                 cursor.execute(
-                    """SELECT created_at FROM messages 
-                       WHERE group_id = ? AND created_at >= ?""",
+                    """SELECT CAST(strftime('%H', created_at, 'unixepoch', 'localtime') AS INTEGER) AS hour,
+                              COUNT(*)
+                       FROM messages 
+                       WHERE group_id = ? AND created_at >= ?
+                       GROUP BY hour""",
                     (group_id, start_time)
                 )
-                rows = cursor.fetchall()
-                
-                hourly_counts = {i: 0 for i in range(24)}
-                for row in rows:
-                    hour = time.localtime(row[0]).tm_hour
-                    hourly_counts[hour] += 1
                 
+                hourly_counts = dict.fromkeys(range(24), 0)
+                hourly_counts.update(cursor.fetchall())
                 return hourly_counts
         
         return await asyncio.to_thread(_query)
@@ -343,12 +469,7 @@ class DatabaseManager:
                 total_messages = cursor.fetchone()[0]
                 
                 # 今日消息数
-                now = time.time()
-                local_time = time.localtime(now)
-                today_start = int(time.mktime(time.struct_time((
-                    local_time.tm_year, local_time.tm_mon, local_time.tm_mday,
-                    0, 0, 0, 0, 0, -1
-                ))))
+                today_start = get_today_start()
                 
                 cursor.execute(
                     "SELECT COUNT(*) FROM messages WHERE group_id = ? AND created_at >= ?",
@@ -398,6 +519,31 @@ class DatabaseManager:
         
         return await asyncio.to_thread(_update)
     
+    async def write_batch(self, messages: List[dict], users: List[Tuple[int, str]]) -> int:
+        """
+        在同一个事务中写入一批消息和用户信息（后台写入队列使用）
+        
+        Returns:
+            新写入的消息数（重复消息被忽略，不计入）
+            
+        Raises:
+            写入或提交失败时抛出异常，事务整体回滚，由调用方决定如何保留数据
+        """
+        def _write():
+            rows = [self._message_row(msg_data) for msg_data in messages]
+            now = int(time.time())
+            with self._get_connection() as conn:
+                inserted = conn.executemany(self._INSERT_MESSAGE_SQL, rows).rowcount if rows else 0
+                if users:
+                    conn.executemany(
+                        self._UPSERT_USER_SQL,
+                        [(user_id, nickname, now) for user_id, nickname in users]
+                    )
+                conn.commit()
+                return inserted
+        
+        return await asyncio.to_thread(_write)
+    
     async def get_user_info(self, user_id: int) -> Optional[Dict[str, Any]]:
         """获取用户信息"""
         def _query():
@@ -448,8 +594,6 @@ class DatabaseManager:
             start_time: 开始时间戳（可选）
             end_time: 结束时间戳（可选）
         """
-        import time
-        
         # 如果没有指定时间范围，使用最近 N 天
         if end_time is None:
             end_time = int(time.time())
@@ -497,8 +641,6 @@ class DatabaseManager:
                                        start_time: int = None, end_time: int = None,
                                        limit: int = 10) -> List[Tuple]:
         """获取指定时间段的用户发言排行"""
-        import time
-        
         if end_time is None:
             end_time = int(time.time())
         if start_time is None:
@@ -523,11 +665,8 @@ class DatabaseManager:
     async def get_period_daily_counts(self, group_id: int, days: int = 7,
                                        start_time: int = None, end_time: int = None) -> Dict[str, int]:
         """获取指定时间段每天的消息数，返回 {日期: 数量}"""
-        import time as time_module
-        from datetime import datetime, timedelta
-        
         if end_time is None:
-            end_time = int(time_module.time())
+            end_time = int(time.time())
         if start_time is None:
             start_time = end_time - days * 86400
             
@@ -544,7 +683,7 @@ class DatabaseManager:
                 # 按天统计
                 daily_counts = {}
                 for row in rows:
-                    day = time_module.strftime('%m/%d', time_module.localtime(row[0]))
+                    day = time.strftime('%m/%d', time.localtime(row[0]))
                     daily_counts[day] = daily_counts.get(day, 0) + 1
                 
                 # 生成连续日期字典
@@ -565,10 +704,8 @@ class DatabaseManager:
     async def get_period_messages(self, group_id: int, days: int = 7,
                                    start_time: int = None, end_time: int = None) -> List[Dict]:
         """获取指定时间段的所有消息（用于NLP分析）"""
-        import time as time_module
-        
         if end_time is None:
-            end_time = int(time_module.time())
+            end_time = int(time.time())
         if start_time is None:
             start_time = end_time - days * 86400
             
@@ -596,6 +733,67 @@ class DatabaseManager:
         
         return await asyncio.to_thread(_query)
     
+    async def get_period_texts(self, group_id: int, days: int = 7,
+                                start_time: int = None, end_time: int = None) -> List[str]:
+        """
+        获取指定时间段内所有文本消息段（用于 NLP 分析）
+        
+        使用 SQLite JSON1 的 json_each 在库内展开消息段并筛选文本，
+        Python 侧无需逐行解析 JSON；返回去除首尾空白后长度大于 1 的文本
+        
+        无效 JSON、非数组内容与非对象的数组元素都用 CASE 先行排除（json_extract 遇到非 JSON 文本会报错，
+        不能依赖 AND 的求值顺序）；只有 SQLite 缺少 JSON1 时才回退到 Python 解析
+        """
+        if end_time is None:
+            end_time = int(time.time())
+        if start_time is None:
+            start_time = end_time - days * 86400
+        
+        def _query():
+            with self._get_connection() as conn:
+                if self._json1_available:
+                    rows = conn.execute(
+                        """SELECT seg_text FROM (
+                               SELECT CASE WHEN seg.type = 'object'
+                                           THEN json_extract(seg.value, '$.type') END AS seg_type,
+                                      CASE WHEN seg.type = 'object'
+                                           THEN json_extract(seg.value, '$.data.text') END AS seg_text
+                               FROM messages,
+                                    json_each(CASE WHEN NOT json_valid(messages.raw_content) THEN '[]'
+                                                   WHEN json_type(messages.raw_content) = 'array'
+                                                   THEN messages.raw_content
+                                                   ELSE '[]' END) AS seg
+                               WHERE messages.group_id = ? AND messages.created_at >= ? AND messages.created_at < ?
+                           )
+                           WHERE seg_type = 'text'""",
+                        (group_id, start_time, end_time)
+                    ).fetchall()
+                    texts = (row[0].strip() for row in rows if isinstance(row[0], str))
+                else:
+                    rows = conn.execute(
+                        """SELECT raw_content FROM messages 
+                           WHERE group_id = ? AND created_at >= ? AND created_at < ?""",
+                        (group_id, start_time, end_time)
+                    ).fetchall()
+                    texts = []
+                    for row in rows:
+                        # 与 json_valid 筛选一致：无法解析或不是消息段列表的行直接跳过
+                        try:
+                            segments = fastjson.loads(row[0])
+                        except (fastjson.JSONDecodeError, TypeError):
+                            continue
+                        if not isinstance(segments, list):
+                            continue
+                        for seg in segments:
+                            if isinstance(seg, dict) and seg.get('type') == 'text':
+                                data = seg.get('data')
+                                text = data.get('text') if isinstance(data, dict) else None
+                                if isinstance(text, str):
+                                    texts.append(text.strip())
+                return [text for text in texts if len(text) > 1]
+        
+        return await asyncio.to_thread(_query)
+    
     async def get_user_stats(self, group_id: int, user_id: int) -> Dict[str, Any]:
         """获取特定用户的统计数据"""
         def _query():
@@ -645,17 +843,16 @@ class DatabaseManager:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
-                    """SELECT created_at FROM messages 
-                       WHERE group_id = ? AND user_id = ?""",
+                    """SELECT CAST(strftime('%H', created_at, 'unixepoch', 'localtime') AS INTEGER) AS hour,
+                              COUNT(*)
+                       FROM messages 
+                       WHERE group_id = ? AND user_id = ?
+                       GROUP BY hour""",
                     (group_id, user_id)
                 )
-                rows = cursor.fetchall()
-                
-                hourly_counts = {i: 0 for i in range(24)}
-                for row in rows:
-                    hour = time.localtime(row[0]).tm_hour
-                    hourly_counts[hour] += 1
                 
+                hourly_counts = dict.fromkeys(range(24), 0)
+                hourly_counts.update(cursor.fetchall())
                 return hourly_counts
         
         return await asyncio.to_thread(_query)
@@ -734,10 +931,8 @@ class DatabaseManager:
             start_time: 开始时间戳（可选，如果不指定则使用 days）
             limit: 返回数量限制
         """
-        import time as time_module
-        
         if start_time is None:
-            start_time = int(time_module.time()) - days * 86400
+            start_time = int(time.time()) - days * 86400
             
         def _query():
             with self._get_connection() as conn:
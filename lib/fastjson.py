@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+JSON 编解码模块
+优先使用 orjson（C 实现），未安装时回退到标准库 json，接口保持一致
+"""
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
+
+if ORJSON_AVAILABLE:
+    # orjson.JSONDecodeError 是 json.JSONDecodeError 的子类
+    JSONDecodeError = orjson.JSONDecodeError
+    loads = orjson.loads  # 同时接受 str 和 bytes
+
+    def dumps_bytes(obj, sort_keys: bool = False, default=None) -> bytes:
+        """
+        序列化为 UTF-8 字节（紧凑格式，保留中文）
+
+        Args:
+            sort_keys: 字典按键排序（用于生成稳定的哈希）
+            default: 无法序列化的对象的转换函数
+        """
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=default, option=option)
+
+    def dumps(obj) -> str:
+        """序列化为字符串（紧凑格式，保留中文）"""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+else:
+    JSONDecodeError = json.JSONDecodeError
+    loads = json.loads
+
+    def dumps(obj) -> str:
+        """序列化为字符串（紧凑格式，保留中文）"""
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+    def dumps_bytes(obj, sort_keys: bool = False, default=None) -> bytes:
+        """
+        序列化为 UTF-8 字节（紧凑格式，保留中文）
+
+        Args:
+            sort_keys: 字典按键排序（用于生成稳定的哈希）
+            default: 无法序列化的对象的转换函数
+        """
+        return json.dumps(
+            obj, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys, default=default
+        ).encode('utf-8')
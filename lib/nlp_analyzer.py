@@ -7,9 +7,11 @@ NLP 分析模块
 import json
 import logging
 import re
+import time
 from typing import List, Dict, Tuple, Optional, Any
 from collections import Counter, defaultdict
 from dataclasses import dataclass
+from itertools import groupby
 
 logger = logging.getLogger("NLPAnalyzer")
 
@@ -291,18 +293,17 @@ class NLPAnalyzer:
         if not messages:
             return []
         
-        # 提取纯文本内容
-        msg_texts = []
+        # 提取纯文本内容（文本与发送者分列存放，便于按下标切片）
+        texts = []
+        user_ids = []
         
         for msg in messages:
             # 处理简单元组格式 (text, user_id)
             if isinstance(msg, (tuple, list)) and len(msg) >= 2:
                 text, user_id = msg[0], msg[1]
                 if text and text.strip():
-                    msg_texts.append({
-                        'user_id': user_id,
-                        'text': text.strip()
-                    })
+                    texts.append(text.strip())
+                    user_ids.append(user_id)
                 continue
             
             # 处理 dict 格式
@@ -321,42 +322,27 @@ class NLPAnalyzer:
                     
                     full_text = ''.join(text_parts).strip()
                     if full_text:
-                        msg_texts.append({
-                            'user_id': msg.get('user_id'),
-                            'text': full_text,
-                            'time': msg.get('created_at', 0)
-                        })
+                        texts.append(full_text)
+                        user_ids.append(msg.get('user_id'))
                 except Exception:
                     continue
         
-        if not msg_texts:
+        if not texts:
             return []
         
-        # 检测连续复读
+        # 检测连续复读：groupby 在 C 层按相邻相等切分游程，
+        # 只有达到阈值的游程才构造结果
         repeats = []
-        current_text = None
-        current_users = []
-        
-        for item in msg_texts:
-            if item['text'] == current_text:
-                current_users.append(item['user_id'])
-            else:
-                if len(current_users) >= min_repeat:
-                    repeats.append({
-                        'text': current_text[:50] + ('...' if len(current_text) > 50 else ''),
-                        'count': len(current_users),
-                        'users': list(set(current_users))
-                    })
-                current_text = item['text']
-                current_users = [item['user_id']]
-        
-        # 处理最后一组
-        if len(current_users) >= min_repeat:
-            repeats.append({
-                'text': current_text[:50] + ('...' if len(current_text) > 50 else ''),
-                'count': len(current_users),
-                'users': list(set(current_users))
-            })
+        start = 0
+        for text, run in groupby(texts):
+            count = len(list(run))
+            if count >= min_repeat:
+                repeats.append({
+                    'text': text[:50] + ('...' if len(text) > 50 else ''),
+                    'count': count,
+                    'users': list(set(user_ids[start:start + count]))
+                })
+            start += count
         
         # 按复读次数排序
         repeats.sort(key=lambda x: x['count'], reverse=True)
@@ -424,8 +410,6 @@ class NLPAnalyzer:
         分析用户活跃时段
         返回: {hour: count, ...}
         """
-        import time
-        
         hourly = {i: 0 for i in range(24)}
         
         for msg in messages:
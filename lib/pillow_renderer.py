@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+"""
+轻量渲染器 - Pillow 直接绘制
+用于复读机、撤回统计、统计概览、发言排行、24小时活跃度等纯数据卡片，无需启动 Chromium
+"""
+
+import io
+import logging
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger("PillowRenderer")
+
+# Pillow
+try:
+    from PIL import Image, ImageDraw, ImageFont
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+    logger.warning("Pillow 未安装，轻量渲染不可用")
+
+
+# ==================== 配色（与 templates/base.html 保持一致） ====================
+BG_COLOR = (246, 242, 255)
+CARD_COLOR = (255, 255, 255)
+ITEM_COLOR = (250, 250, 250)
+CHIP_COLOR = (243, 237, 247)
+DIVIDER_COLOR = (231, 224, 236)
+PRIMARY_COLOR = (103, 80, 164)
+TEXT_COLOR = (29, 27, 32)
+SUB_TEXT_COLOR = (73, 69, 79)
+HINT_COLOR = (121, 116, 126)
+
+# 统计概览四宫格的渐变色（与 visualizer.STATS_CSS 保持一致）
+STAT_GRADIENTS = [
+    ((232, 222, 248), (208, 188, 255)),
+    ((208, 248, 206), (168, 230, 207)),
+    ((255, 229, 208), (255, 204, 128)),
+    ((212, 229, 255), (144, 202, 249)),
+]
+
+# 排行进度条渐变色（与 visualizer.GRADIENT_COLORS 保持一致）
+BAR_GRADIENTS = [
+    ((103, 80, 164), (154, 130, 219)),
+    ((0, 106, 106), (77, 182, 172)),
+    ((125, 82, 96), (196, 139, 159)),
+    ((56, 106, 32), (129, 199, 132)),
+    ((125, 87, 0), (255, 183, 77)),
+]
+MEDAL_COLORS = [(255, 190, 0), (180, 180, 180), (196, 121, 51)]
+BAR_BG_COLOR = (236, 230, 240)
+PEAK_GRADIENT = ((255, 230, 109), (255, 107, 107))
+HOUR_GRADIENT = ((154, 130, 219), (103, 80, 164))
+
+REPEATER_RANK_COLORS = [(255, 190, 0), (180, 180, 180), (196, 121, 51), PRIMARY_COLOR]
+RECALL_RANK_COLORS = [(238, 98, 98), (255, 160, 19), (255, 198, 20), (108, 133, 145)]
+
+SCALE = 2  # 与 Playwright 的 device_scale_factor 一致
+PADDING = 24
+
+# PNG 压缩级别：默认 1 以编码速度优先（图片只发送一次，带宽不是瓶颈），
+# 需要更小体积时可通过环境变量 PNG_COMPRESS_LEVEL 调高（最大 9）
+_PNG_COMPRESS_LEVEL = int(os.environ.get("PNG_COMPRESS_LEVEL", "1"))
+
+
+@lru_cache(maxsize=32)
+def _load_font(font_path: str, size: int):
+    """加载字体（按路径和字号缓存）"""
+    return ImageFont.truetype(font_path, size * SCALE)
+
+
+def _fit_text(font, text: str, max_width: int) -> str:
+    """超出宽度时截断并追加省略号"""
+    limit = max_width * SCALE
+    if font.getlength(text) <= limit:
+        return text
+    while text and font.getlength(text + '…') > limit:
+        text = text[:-1]
+    return text + '…'
+
+
+class PillowCardRenderer:
+    """基于 Pillow 的卡片渲染器"""
+
+    def __init__(self, font_path: str):
+        self.font_path = font_path
+
+    @property
+    def available(self) -> bool:
+        """Pillow 已安装且字体文件存在"""
+        return PILLOW_AVAILABLE and bool(self.font_path) and Path(self.font_path).exists()
+
+    def _font(self, size: int):
+        return _load_font(self.font_path, size)
+
+    # ==================== 绘制基础组件 ====================
+
+    def _new_canvas(self, width: int, height: int):
+        """创建画布并绘制卡片底板"""
+        img = Image.new('RGB', (width * SCALE, height * SCALE), BG_COLOR)
+        draw = ImageDraw.Draw(img)
+        self._rounded(draw, PADDING, PADDING, width - PADDING, height - PADDING, 28, CARD_COLOR)
+        return img, draw
+
+    @staticmethod
+    def _rounded(draw, x0: int, y0: int, x1: int, y1: int, radius: int, fill):
+        draw.rounded_rectangle(
+            (x0 * SCALE, y0 * SCALE, x1 * SCALE, y1 * SCALE),
+            radius=radius * SCALE,
+            fill=fill
+        )
+
+    def _text(self, draw, x: int, y: int, text: str, size: int, fill, anchor: str = 'la'):
+        draw.text((x * SCALE, y * SCALE), text, font=self._font(size), fill=fill, anchor=anchor)
+
+    def _draw_header(self, draw, width: int, icon: str, title: str, subtitle: str, timestamp: str) -> int:
+        """绘制卡片头部，返回下一个元素的 y 坐标"""
+        left = PADDING * 2
+        top = PADDING * 2
+
+        self._rounded(draw, left, top, left + 56, top + 56, 16, PRIMARY_COLOR)
+        self._text(draw, left + 28, top + 28, icon, 26, (255, 255, 255), anchor='mm')
+
+        self._text(draw, left + 72, top + 6, title, 22, TEXT_COLOR)
+        self._text(draw, left + 72, top + 36, subtitle, 14, SUB_TEXT_COLOR)
+
+        chip_font = self._font(12)
+        chip_w = chip_font.getlength(timestamp) / SCALE + 24
+        right = width - PADDING * 2
+        self._rounded(draw, right - chip_w, top + 16, right, top + 40, 12, CHIP_COLOR)
+        self._text(draw, right - chip_w / 2, top + 28, timestamp, 12, HINT_COLOR, anchor='mm')
+
+        divider_y = top + 72
+        draw.line(
+            (left * SCALE, divider_y * SCALE, right * SCALE, divider_y * SCALE),
+            fill=DIVIDER_COLOR, width=SCALE
+        )
+        return divider_y + 24
+
+    def _draw_rank_row(self, draw, width: int, y: int, rank: int, colors: List[Tuple[int, int, int]],
+                       title: str, meta: str, count: int) -> int:
+        """绘制一行排行条目，返回下一行的 y 坐标"""
+        left = PADDING * 2
+        right = width - PADDING * 2
+        row_h = 64
+
+        self._rounded(draw, left, y, right, y + row_h, 16, ITEM_COLOR)
+
+        color = colors[min(rank, len(colors)) - 1]
+        self._rounded(draw, left + 16, y + 14, left + 52, y + 50, 12, color)
+        self._text(draw, left + 34, y + 32, str(rank), 16, (255, 255, 255), anchor='mm')
+
+        count_text = f"{count} 次"
+        count_w = self._font(20).getlength(count_text) / SCALE
+        text_max = right - 16 - count_w - 12 - (left + 64)
+
+        self._text(draw, left + 64, y + 12, _fit_text(self._font(15), title, text_max), 15, TEXT_COLOR)
+        self._text(draw, left + 64, y + 38, meta, 12, HINT_COLOR)
+        self._text(draw, right - 16, y + 32, count_text, 20, PRIMARY_COLOR, anchor='rm')
+
+        return y + row_h + 10
+
+    def _gradient_box(self, img, x0: int, y0: int, x1: int, y1: int, radius: int, colors,
+                      direction: str = 'diagonal', corners: Tuple[bool, bool, bool, bool] = None):
+        """
+        绘制渐变圆角矩形
+
+        Args:
+            direction: 'diagonal'（左上到右下）、'horizontal'（左到右）或 'vertical'（下到上）
+            corners: 需要圆角的角 (左上, 右上, 右下, 左下)，默认全部
+        """
+        w, h = max(int((x1 - x0) * SCALE), 1), max(int((y1 - y0) * SCALE), 1)
+        # 2x2 色块双线性放大即得到渐变，无需逐像素计算
+        start, end = colors
+        mid = tuple((a + b) // 2 for a, b in zip(start, end))
+        seed = Image.new('RGB', (2, 2))
+        if direction == 'horizontal':
+            seed.putdata([start, end, start, end])
+        elif direction == 'vertical':
+            seed.putdata([end, end, start, start])
+        else:
+            seed.putdata([start, mid, mid, end])
+        fill = seed.resize((w, h), Image.BILINEAR)
+
+        mask = Image.new('L', (w, h), 0)
+        radius = min(radius * SCALE, w // 2, h // 2)
+        ImageDraw.Draw(mask).rounded_rectangle((0, 0, w - 1, h - 1), radius=radius, fill=255, corners=corners)
+        img.paste(fill, (int(x0 * SCALE), int(y0 * SCALE)), mask)
+
+    def _paste_avatar(self, img, x: int, y: int, size: int, data: Optional[bytes]) -> bool:
+        """粘贴圆形头像，图片数据无效时返回 False"""
+        if not data:
+            return False
+        try:
+            avatar = Image.open(io.BytesIO(data)).convert('RGB')
+        except Exception:
+            return False
+        px = size * SCALE
+        avatar = avatar.resize((px, px), Image.LANCZOS)
+        mask = Image.new('L', (px, px), 0)
+        ImageDraw.Draw(mask).ellipse((0, 0, px - 1, px - 1), fill=255)
+        img.paste(avatar, (int(x * SCALE), int(y * SCALE)), mask)
+        return True
+
+    def _draw_empty(self, draw, width: int, y: int, text: str) -> int:
+        self._text(draw, width / 2, y + 40, text, 14, HINT_COLOR, anchor='mm')
+        return y + 80
+
+    @staticmethod
+    def _encode(img) -> bytes:
+        buf = io.BytesIO()
+        img.save(buf, format='PNG', compress_level=_PNG_COMPRESS_LEVEL)
+        return buf.getvalue()
+
+    # ==================== 卡片 ====================
+
+    def render_repeater(
+        self,
+        repeats: List[Dict[str, Any]],
+        total_repeats: int,
+        total_users: int,
+        total_messages: int,
+        timestamp: str,
+        width: int = 500
+    ) -> bytes:
+        """绘制复读机报告"""
+        items = repeats[:10]
+        body_h = len(items) * 74 if items else 80
+        height = PADDING * 2 + 96 + 84 + body_h + 60 + PADDING * 2
+
+        img, draw = self._new_canvas(width, height)
+        y = self._draw_header(draw, width, '复', '复读机检测报告', '人类的本质是...复读机！', timestamp)
+
+        # 摘要
+        left = PADDING * 2
+        right = width - PADDING * 2
+        self._rounded(draw, left, y, right, y + 68, 20, (255, 229, 208))
+        self._text(draw, width / 2, y + 22, f"共检测到 {total_repeats} 次复读行为", 16, TEXT_COLOR, anchor='mm')
+        self._text(draw, width / 2, y + 48, f"涉及 {total_users} 名群友参与", 13, SUB_TEXT_COLOR, anchor='mm')
+        y += 84
+
+        if items:
+            for i, item in enumerate(items, 1):
+                y = self._draw_rank_row(
+                    draw, width, y, i, REPEATER_RANK_COLORS,
+                    f"“{item['text']}”", f"{len(item.get('users', ()))} 人参与复读", item['count']
+                )
+        else:
+            y = self._draw_empty(draw, width, y, '今日暂未检测到复读行为')
+
+        self._text(draw, width / 2, y + 26, f"分析了 {total_messages} 条消息", 14, SUB_TEXT_COLOR, anchor='mm')
+        return self._encode(img)
+
+    def render_recall(
+        self,
+        ranking: List[Dict[str, Any]],
+        total_recalls: int,
+        total_users: int,
+        days: int,
+        timestamp: str,
+        width: int = 500
+    ) -> bytes:
+        """绘制撤回统计报告"""
+        body_h = len(ranking) * 74 if ranking else 80
+        height = PADDING * 2 + 96 + 92 + body_h + PADDING * 2
+
+        img, draw = self._new_canvas(width, height)
+        y = self._draw_header(draw, width, '撤', '撤回消息统计', f"最近 {days} 天", timestamp)
+
+        # 摘要
+        left = PADDING * 2
+        right = width - PADDING * 2
+        self._rounded(draw, left, y, right, y + 76, 16, (249, 246, 252))
+        for cx, value, label in (
+            (width / 2 - 60, total_recalls, '总撤回次数'),
+            (width / 2 + 60, total_users, '涉及用户'),
+        ):
+            self._text(draw, cx, y + 28, str(value), 24, PRIMARY_COLOR, anchor='mm')
+            self._text(draw, cx, y + 56, label, 12, HINT_COLOR, anchor='mm')
+        y += 92
+
+        if ranking:
+            for user in ranking:
+                y = self._draw_rank_row(
+                    draw, width, y, user['rank'], RECALL_RANK_COLORS,
+                    user['nickname'], '撤回达人', user['count']
+                )
+        else:
+            self._draw_empty(draw, width, y, f"最近 {days} 天暂无撤回记录")
+
+        return self._encode(img)
+
+    def render_stats(
+        self,
+        stats: Dict[str, Any],
+        timestamp: str,
+        generated_at: str,
+        width: int = 500
+    ) -> bytes:
+        """绘制群聊统计概览（四宫格 + 统计时间）"""
+        grid_gap = 16
+        cell_h = 120
+        height = PADDING * 2 + 96 + cell_h * 2 + grid_gap + 20 + 48 + PADDING * 2
+
+        img, draw = self._new_canvas(width, height)
+        y = self._draw_header(draw, width, '统', '群聊统计概览', '数据统计摘要', timestamp)
+
+        left = PADDING * 2
+        right = width - PADDING * 2
+        cell_w = (right - left - grid_gap) / 2
+        cells = (
+            (stats.get('total_messages', 0), '总消息数'),
+            (stats.get('today_messages', 0), '今日消息'),
+            (stats.get('total_users', 0), '活跃用户'),
+            (stats.get('total_images', 0), '图片总数'),
+        )
+        for i, (value, label) in enumerate(cells):
+            x0 = left + (i % 2) * (cell_w + grid_gap)
+            y0 = y + (i // 2) * (cell_h + grid_gap)
+            self._gradient_box(img, x0, y0, x0 + cell_w, y0 + cell_h, 24, STAT_GRADIENTS[i])
+            cx = x0 + cell_w / 2
+            self._text(draw, cx, y0 + 50, f"{value:,}", 32, TEXT_COLOR, anchor='mm')
+            self._text(draw, cx, y0 + 88, label, 14, SUB_TEXT_COLOR, anchor='mm')
+        y += cell_h * 2 + grid_gap + 20
+
+        self._rounded(draw, left, y, right, y + 48, 16, CHIP_COLOR)
+        self._text(draw, width / 2, y + 24, f"统计时间：{generated_at}", 13, SUB_TEXT_COLOR, anchor='mm')
+        return self._encode(img)
+
+    def render_rank(
+        self,
+        users: List[Dict[str, Any]],
+        total_messages: int,
+        total_users: int,
+        timestamp: str,
+        avatars: Optional[Dict[int, bytes]] = None,
+        width: int = 550
+    ) -> bytes:
+        """
+        绘制今日发言排行
+
+        Args:
+            users: [{'user_id': 123, 'count': 50, 'nickname': '昵称'}, ...]
+            avatars: {user_id: 头像图片字节}，缺失时绘制占位圆
+        """
+        users = users[:10]
+        avatars = avatars or {}
+        row_h = 72
+        height = PADDING * 2 + 96 + len(users) * (row_h + 10) + 12 + 40 + PADDING * 2
+
+        img, draw = self._new_canvas(width, height)
+        y = self._draw_header(draw, width, '榜', '今日发言排行', f"活跃用户 TOP {len(users)}", timestamp)
+
+        left = PADDING * 2
+        right = width - PADDING * 2
+        for i, user in enumerate(users):
+            count = user['count']
+            percentage = count / total_messages * 100 if total_messages > 0 else 0
+            self._rounded(draw, left, y, right, y + row_h, 16, ITEM_COLOR)
+
+            # 名次：前三名使用奖牌色
+            badge_color = MEDAL_COLORS[i] if i < 3 else PRIMARY_COLOR
+            self._rounded(draw, left + 12, y + 22, left + 40, y + 50, 10, badge_color)
+            self._text(draw, left + 26, y + 36, str(i + 1), 14, (255, 255, 255), anchor='mm')
+
+            # 头像
+            ax, ay = left + 50, y + 16
+            if not self._paste_avatar(img, ax, ay, 40, avatars.get(user['user_id'])):
+                draw.ellipse(
+                    (ax * SCALE, ay * SCALE, (ax + 40) * SCALE, (ay + 40) * SCALE),
+                    fill=CHIP_COLOR
+                )
+
+            # 发言数
+            count_text = f"{count} 条"
+            count_w = self._font(18).getlength(count_text) / SCALE
+            self._text(draw, right - 14, y + row_h / 2, count_text, 18, PRIMARY_COLOR, anchor='rm')
+
+            # 昵称、占比与进度条
+            info_left = ax + 52
+            info_right = right - 14 - count_w - 14
+            pct_text = f"{percentage:.1f}%"
+            pct_w = self._font(12).getlength(pct_text) / SCALE
+            nickname = _fit_text(
+                self._font(15), str(user.get('nickname') or user['user_id'])[:24],
+                info_right - info_left - pct_w - 8
+            )
+            self._text(draw, info_left, y + 14, nickname, 15, TEXT_COLOR)
+            self._text(draw, info_right, y + 16, pct_text, 12, HINT_COLOR, anchor='ra')
+
+            bar_y = y + 44
+            self._rounded(draw, info_left, bar_y, info_right, bar_y + 8, 4, BAR_BG_COLOR)
+            bar_w = (info_right - info_left) * min(percentage, 100) / 100
+            if bar_w >= 1:
+                self._gradient_box(img, info_left, bar_y, info_left + bar_w, bar_y + 8, 4,
+                                   BAR_GRADIENTS[i % len(BAR_GRADIENTS)], direction='horizontal')
+            y += row_h + 10
+
+        # 底部统计
+        y += 12
+        half = width / 2
+        for cx, text in ((half - 90, f"今日共 {total_messages} 条消息"), (half + 90, f"{total_users} 人参与")):
+            chip_w = self._font(13).getlength(text) / SCALE + 28
+            self._rounded(draw, cx - chip_w / 2, y, cx + chip_w / 2, y + 36, 18, CHIP_COLOR)
+            self._text(draw, cx, y + 18, text, 13, SUB_TEXT_COLOR, anchor='mm')
+        return self._encode(img)
+
+    def render_hourly(
+        self,
+        hourly_counts: Dict[int, int],
+        timestamp: str,
+        width: int = 800
+    ) -> bytes:
+        """绘制 24 小时活跃度柱状图"""
+        counts = [hourly_counts.get(hour, 0) for hour in range(24)]
+        peak_hour = max(range(24), key=counts.__getitem__)
+        peak = counts[peak_hour]
+        max_count = max(peak, 1)
+
+        chart_h = 220
+        height = PADDING * 2 + 96 + chart_h + 24 + 80 + PADDING * 2
+
+        img, draw = self._new_canvas(width, height)
+        y = self._draw_header(draw, width, '时', '24小时活跃度', '消息分布统计', timestamp)
+
+        # 柱状图
+        left = PADDING * 2
+        right = width - PADDING * 2
+        gap = 4
+        col = (right - left - gap * 23) / 24
+        top = y + 16
+        bars_h = chart_h - 16 - 28
+        for hour, count in enumerate(counts):
+            is_peak = hour == peak_hour and count > 0
+            x = left + hour * (col + gap)
+            bw = col * 0.7
+            bx = x + (col - bw) / 2
+            bh = max(bars_h * max(count / max_count, 0.02), 4)
+            by = top + bars_h - bh
+            self._gradient_box(img, bx, by, bx + bw, by + bh, 4,
+                               PEAK_GRADIENT if is_peak else HOUR_GRADIENT,
+                               direction='vertical', corners=(True, True, False, False))
+            label_color = PRIMARY_COLOR if is_peak else HINT_COLOR
+            self._text(draw, x + col / 2, y + chart_h - 8, f"{hour:02d}", 11, label_color, anchor='ms')
+            if is_peak:
+                self._text(draw, x + col / 2, by - 4, str(count), 10, PRIMARY_COLOR, anchor='ms')
+        y += chart_h + 24
+
+        # 汇总
+        box_gap = 16
+        box_w = (right - left - box_gap * 2) / 3
+        for i, (value, label) in enumerate((
+            (str(sum(counts)), '今日总消息'),
+            (f"{peak_hour:02d}:00", '最活跃时段'),
+            (str(peak), '峰值消息数'),
+        )):
+            x0 = left + i * (box_w + box_gap)
+            self._rounded(draw, x0, y, x0 + box_w, y + 80, 20, (249, 246, 252))
+            self._text(draw, x0 + box_w / 2, y + 32, value, 24, PRIMARY_COLOR, anchor='mm')
+            self._text(draw, x0 + box_w / 2, y + 60, label, 12, HINT_COLOR, anchor='mm')
+        return self._encode(img)
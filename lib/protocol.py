@@ -4,15 +4,48 @@ OneBot V11 协议解析与构建模块
 实现消息解析、事件分类和 API 调用构建
 """
 
-import json
 import logging
+import re
 import time
+from functools import cached_property
 from typing import Dict, List, Any, Optional, Union
 from dataclasses import dataclass, field
 from enum import Enum
 
+from . import fastjson
+
 logger = logging.getLogger("Protocol")
 
+# 文本段匹配：捕获 "data" 中 "text" 的 JSON 字符串字面量（含两侧引号）
+_TEXT_SEGMENT_RE = re.compile(
+    r'"type"\s*:\s*"text"\s*,\s*"data"\s*:\s*\{\s*"text"\s*:\s*("(?:[^"\\]|\\.)*")'
+)
+
+
+def extract_segment_texts(raw_content: str) -> List[str]:
+    """
+    从数据库中存储的消息段 JSON 提取所有文本段内容
+    
+    用预编译正则直接匹配，无需完整解析 JSON；字段顺序与预期不符时回退到 JSON 解析，
+    无法解析的内容整体视为纯文本
+    """
+    texts = [
+        fastjson.loads(literal) if '\\' in literal else literal[1:-1]
+        for literal in _TEXT_SEGMENT_RE.findall(raw_content)
+    ]
+    if texts or (raw_content.startswith('[') and '"text"' not in raw_content):
+        return texts
+    
+    try:
+        segments = fastjson.loads(raw_content)
+    except fastjson.JSONDecodeError:
+        return [raw_content]
+    return [
+        seg.get('data', {}).get('text', '')
+        for seg in segments
+        if isinstance(seg, dict) and seg.get('type') == 'text'
+    ]
+
 
 class PostType(Enum):
     """事件类型"""
@@ -90,59 +123,94 @@ class MessageSegment:
         return {"type": self.type, "data": self.data}
 
 
+# 单张 Base64 图片群消息的序列化模板，按 __B64__ 切成前后两段；
+# 群号在 OneBotProtocol 中按群缓存替换，echo 每次发送时填入
+_IMAGE_MSG_HEAD, _IMAGE_MSG_TAIL = fastjson.dumps_bytes({
+    "action": "send_group_msg",
+    "params": {
+        "group_id": 0,
+        "message": [MessageSegment.image_base64("__B64__").to_dict()]
+    },
+    "echo": "__ECHO__"
+}).split(b'__B64__')
+
+
 @dataclass
 class GroupMessage:
-    """群消息事件"""
+    """
+    群消息事件
+    
+    只保存事件中的原始消息段字典（入库时直接序列化），各辅助方法也直接读取字典；
+    MessageSegment 列表在首次访问 message 时才构建
+    """
     message_id: int
     group_id: int
     user_id: int
-    message: List[MessageSegment]
     raw_message: str
     time: int
     self_id: int
     sender: Dict[str, Any]
+    raw_segments: List[Dict[str, Any]] = field(default_factory=list, repr=False)
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "GroupMessage":
         """从字典创建"""
-        message_segments = [
-            MessageSegment(type=seg['type'], data=seg.get('data', {}))
-            for seg in data.get('message', [])
-        ]
         return cls(
             message_id=data.get('message_id', 0),
             group_id=data.get('group_id', 0),
             user_id=data.get('user_id', 0),
-            message=message_segments,
             raw_message=data.get('raw_message', ''),
             time=data.get('time', int(time.time())),
             self_id=data.get('self_id', 0),
-            sender=data.get('sender', {})
+            sender=data.get('sender', {}),
+            raw_segments=data.get('message', [])
         )
     
+    @cached_property
+    def message(self) -> List[MessageSegment]:
+        """消息段列表（按需构建）"""
+        return [
+            MessageSegment(type=seg['type'], data=seg.get('data', {}))
+            for seg in self.raw_segments
+        ]
+    
     def get_plain_text(self) -> str:
         """获取纯文本内容"""
         texts = []
-        for seg in self.message:
-            if seg.type == 'text':
-                texts.append(seg.data.get('text', ''))
+        for seg in self.raw_segments:
+            if seg.get('type') == 'text':
+                texts.append(seg.get('data', {}).get('text', ''))
         return ''.join(texts).strip()
     
+    def text_startswith(self, prefix: str) -> bool:
+        """
+        纯文本内容是否以 prefix 开头
+        
+        只检查第一个非空白文本段，无需拼接全部文本，用于快速排除非命令消息
+        """
+        for seg in self.raw_segments:
+            if seg.get('type') == 'text':
+                text = seg.get('data', {}).get('text', '').lstrip()
+                if text:
+                    return text.startswith(prefix)
+        return False
+    
     def get_images(self) -> List[Dict[str, str]]:
         """获取所有图片"""
         images = []
-        for seg in self.message:
-            if seg.type == 'image':
+        for seg in self.raw_segments:
+            if seg.get('type') == 'image':
+                data = seg.get('data', {})
                 images.append({
-                    'file': seg.data.get('file', ''),
-                    'url': seg.data.get('url', '')
+                    'file': data.get('file', ''),
+                    'url': data.get('url', '')
                 })
         return images
     
     def has_at(self, qq: int) -> bool:
         """检查是否@了某人"""
-        for seg in self.message:
-            if seg.type == 'at' and str(seg.data.get('qq')) == str(qq):
+        for seg in self.raw_segments:
+            if seg.get('type') == 'at' and str(seg.get('data', {}).get('qq')) == str(qq):
                 return True
         return False
 
@@ -170,6 +238,7 @@ class OneBotProtocol:
     
     def __init__(self):
         self._echo_counter = 0
+        self._image_msg_heads: Dict[int, bytes] = {}  # 群号 -> 已填入群号的图片消息前缀
     
     def _get_echo(self) -> str:
         """生成唯一的 echo 标识"""
@@ -260,21 +329,15 @@ class OneBotProtocol:
     
     # ==================== API 构建方法 ====================
     
-    def build_send_group_msg(self, group_id: int, 
-                             message: Union[str, List[MessageSegment]]) -> str:
-        """
-        构建发送群消息的 API 调用
-        
-        Args:
-            group_id: 群号
-            message: 消息内容，可以是字符串或消息段列表
-        """
+    def _group_msg_payload(self, group_id: int,
+                           message: Union[str, List[MessageSegment]]) -> Dict[str, Any]:
+        """构建发送群消息的请求字典"""
         if isinstance(message, str):
             msg_array = [MessageSegment.text(message).to_dict()]
         else:
             msg_array = [seg.to_dict() for seg in message]
         
-        payload = {
+        return {
             "action": "send_group_msg",
             "params": {
                 "group_id": group_id,
@@ -282,7 +345,44 @@ class OneBotProtocol:
             },
             "echo": self._get_echo()
         }
-        return json.dumps(payload, ensure_ascii=False)
+    
+    def build_send_group_msg(self, group_id: int, 
+                             message: Union[str, List[MessageSegment]]) -> str:
+        """
+        构建发送群消息的 API 调用
+        
+        Args:
+            group_id: 群号
+            message: 消息内容，可以是字符串或消息段列表
+        """
+        return fastjson.dumps(self._group_msg_payload(group_id, message))
+    
+    def build_send_group_msg_bytes(self, group_id: int,
+                                   message: Union[str, List[MessageSegment]]) -> bytes:
+        """
+        构建发送群消息的 API 调用（UTF-8 字节）
+        
+        orjson 直接输出字节，省去 decode 为 str 后再由 websockets 编码回 UTF-8
+        """
+        return fastjson.dumps_bytes(self._group_msg_payload(group_id, message))
+    
+    def build_send_group_image(self, group_id: int, b64_data: bytes) -> bytes:
+        """
+        构建发送单张 Base64 图片的群消息 API 调用（UTF-8 字节）
+        
+        Base64 字符不需要 JSON 转义，直接填入预先序列化的模板，
+        省去解码为 str 再整体序列化一遍几百 KB 字符串的开销
+        
+        Args:
+            group_id: 群号
+            b64_data: Base64 编码后的图片字节
+        """
+        head = self._image_msg_heads.get(group_id)
+        if head is None:
+            head = _IMAGE_MSG_HEAD.replace(b'"group_id":0,', b'"group_id":%d,' % int(group_id), 1)
+            self._image_msg_heads[group_id] = head
+        tail = _IMAGE_MSG_TAIL.replace(b'"__ECHO__"', fastjson.dumps_bytes(self._get_echo()), 1)
+        return b''.join((head, b64_data, tail))
     
     def build_send_private_msg(self, user_id: int, 
                                message: Union[str, List[MessageSegment]]) -> str:
@@ -300,7 +400,7 @@ class OneBotProtocol:
             },
             "echo": self._get_echo()
         }
-        return json.dumps(payload, ensure_ascii=False)
+        return fastjson.dumps(payload)
     
     def build_get_group_member_list(self, group_id: int) -> str:
         """构建获取群成员列表的 API 调用"""
@@ -311,7 +411,7 @@ class OneBotProtocol:
             },
             "echo": self._get_echo()
         }
-        return json.dumps(payload)
+        return fastjson.dumps(payload)
     
     def build_get_group_info(self, group_id: int) -> str:
         """构建获取群信息的 API 调用"""
@@ -322,7 +422,7 @@ class OneBotProtocol:
             },
             "echo": self._get_echo()
         }
-        return json.dumps(payload)
+        return fastjson.dumps(payload)
     
     def build_get_stranger_info(self, user_id: int) -> str:
         """构建获取陌生人信息的 API 调用"""
@@ -333,7 +433,7 @@ class OneBotProtocol:
             },
             "echo": self._get_echo()
         }
-        return json.dumps(payload)
+        return fastjson.dumps(payload)
     
     def build_get_group_file_url(self, group_id: int, file_id: str, 
                                   bus_id: int) -> str:
@@ -347,7 +447,7 @@ class OneBotProtocol:
             },
             "echo": self._get_echo()
         }
-        return json.dumps(payload)
+        return fastjson.dumps(payload)
     
     def build_delete_msg(self, message_id: int) -> str:
         """构建撤回消息的 API 调用"""
@@ -358,7 +458,7 @@ class OneBotProtocol:
             },
             "echo": self._get_echo()
         }
-        return json.dumps(payload)
+        return fastjson.dumps(payload)
     
     def build_set_group_ban(self, group_id: int, user_id: int, 
                             duration: int = 60) -> str:
@@ -372,4 +472,4 @@ class OneBotProtocol:
             },
             "echo": self._get_echo()
         }
-        return json.dumps(payload)
+        return fastjson.dumps(payload)
@@ -2,12 +2,14 @@
 """
 可视化渲染器 - Jinja2 + Playwright
 支持浏览器上下文复用，提升渲染性能
+纯数据卡片（复读机、撤回统计）优先走 Pillow 轻量渲染
 """
 
-import io
 import logging
 import asyncio
 import time
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
 from typing import Optional, Dict, Any, List, Tuple
 
@@ -29,15 +31,87 @@ except ImportError:
     PLAYWRIGHT_AVAILABLE = False
     logger.warning("playwright 未安装")
 
+from .pillow_renderer import PillowCardRenderer
+from .cache import TTLCache, content_key
+
+# Chromium 启动参数：关闭服务端截图用不到的 GPU、扩展、后台联网等子系统
+LAUNCH_ARGS = [
+    '--disable-gpu',
+    '--disable-dev-shm-usage',
+    '--no-sandbox',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-sync',
+    '--disable-translate',
+    '--hide-scrollbars',
+    '--mute-audio',
+    '--disable-features=TranslateUI,site-per-process',
+]
+
+# 页面池大小（每个页面可串行复用，避免每次渲染都新建标签页）
+PAGE_POOL_SIZE = 2
+
+# 视口高度：足够容纳绝大多数卡片，截图时按内容高度裁剪，无需反复调整视口
+VIEWPORT_HEIGHT = 2000
+MAX_IMAGE_HEIGHT = 4000
+
+# 内容实际高度：body 子元素的最大底边 + body 下内边距（base.html 为 24px）
+CONTENT_HEIGHT_JS = """() => {
+    let bottom = 0;
+    for (const el of document.body.children) {
+        bottom = Math.max(bottom, el.getBoundingClientRect().bottom + window.scrollY);
+    }
+    return Math.ceil(bottom) + 24;
+}"""
+
+# 启动预热的常用渲染宽度（画像/情感/复读 500，周报月报 550）
+WARMUP_WIDTHS = (500, 550)
+
+TEMPLATE_DIR = Path(__file__).parent.parent / "templates"
+
+
+@lru_cache(maxsize=1)
+def _minute_label(minute: int) -> str:
+    return time.strftime('%H:%M', time.localtime(minute * 60))
+
+
+def now() -> str:
+    """当前时间 HH:MM（按分钟缓存），作为模板全局函数 now() 使用"""
+    return _minute_label(int(time.time()) // 60)
+
+
+def _fmt0(value) -> str:
+    return f"{value:.0f}"
+
+
+def _fmt1(value) -> str:
+    return f"{value:.1f}"
+
+
+def _fmt2(value) -> str:
+    return f"{value:.2f}"
+
+
+class _PagePool:
+    """单个 BrowserContext 及其空闲页面"""
+    
+    def __init__(self, context: "BrowserContext"):
+        self.context = context
+        self.idle: asyncio.Queue = asyncio.Queue()
+        self.size = 0
+
 
 class TemplateRenderer:
     """模板渲染器"""
     
     _instance = None
     _browser: Optional[Browser] = None
-    _context: Optional[BrowserContext] = None
     _playwright = None
     _env = None
+    _pools: Dict[Tuple[int, int], _PagePool] = {}  # (宽度, 缩放) -> 页面池
+    _browser_lock: Optional[asyncio.Lock] = None  # 串行化浏览器启动、上下文创建和关闭
+    font_path: Optional[str] = None  # 轻量渲染使用的中文字体，由主程序设置
+    _image_cache = TTLCache(maxsize=64, ttl=300)  # (模板, 宽度, 上下文哈希) -> 图片
     
     def __new__(cls):
         if cls._instance is None:
@@ -47,103 +121,235 @@ class TemplateRenderer:
     def __init__(self):
         if self._env is None and JINJA2_AVAILABLE:
             # 模板目录
-            template_dir = Path(__file__).parent.parent / "templates"
+            template_dir = TEMPLATE_DIR
             template_dir.mkdir(exist_ok=True)
             
             self._env = Environment(
                 loader=FileSystemLoader(str(template_dir)),
-                autoescape=select_autoescape(['html', 'xml']),
-                enable_async=True
+                autoescape=select_autoescape(['html', 'xml'])
             )
+            self._env.globals['now'] = now
+            self._env.filters.update(fmt0=_fmt0, fmt1=_fmt1, fmt2=_fmt2)
             logger.info(f"Jinja2 模板引擎已初始化，模板目录: {template_dir}")
     
+    def _get_lite_renderer(self) -> Optional[PillowCardRenderer]:
+        """获取 Pillow 轻量渲染器，不可用时返回 None"""
+        lite = PillowCardRenderer(self.font_path)
+        return lite if lite.available else None
+    
+    async def _render_lite(self, method: str, **kwargs) -> Optional[bytes]:
+        """在线程池中执行 Pillow 绘制，失败时返回 None 以回退到 Playwright"""
+        lite = self._get_lite_renderer()
+        if lite is None:
+            return None
+        try:
+            return await asyncio.to_thread(getattr(lite, method), **kwargs)
+        except Exception as e:
+            logger.warning(f"轻量渲染失败，回退到 Playwright: {e}")
+            return None
+    
+    @classmethod
+    def _get_browser_lock(cls) -> asyncio.Lock:
+        """获取浏览器锁（首次使用时在事件循环内创建）"""
+        if cls._browser_lock is None:
+            cls._browser_lock = asyncio.Lock()
+        return cls._browser_lock
+    
+    def _browser_ready(self) -> bool:
+        """浏览器是否已启动且连接正常"""
+        return self._browser is not None and self._browser.is_connected()
+    
     async def _ensure_browser(self):
-        """确保浏览器已启动"""
+        """确保浏览器已启动（后台预热与首次渲染并发时只启动一次）"""
         if not PLAYWRIGHT_AVAILABLE:
             raise RuntimeError("playwright 未安装")
         
-        if self._browser is None or not self._browser.is_connected():
+        if self._browser_ready():
+            return
+        async with self._get_browser_lock():
+            await self._launch_browser()
+    
+    async def _launch_browser(self):
+        """浏览器未启动或已断开时启动，调用方需持有浏览器锁"""
+        if not self._browser_ready():
             if self._playwright is None:
                 self._playwright = await async_playwright().start()
             
-            self._browser = await self._playwright.chromium.launch(headless=True)
-            self._context = await self._browser.new_context(
-                viewport={'width': 800, 'height': 600},
-                device_scale_factor=2  # 高清渲染
+            self._browser = await self._playwright.chromium.launch(
+                headless=True,
+                args=LAUNCH_ARGS,
+                chromium_sandbox=False,
+                # 信号由机器人自身处理，避免 Ctrl+C 时浏览器先于清理逻辑退出
+                handle_sigint=False,
+                handle_sigterm=False,
+                handle_sighup=False
             )
-            logger.info("Playwright 浏览器上下文已创建")
+            TemplateRenderer._pools = {}
+            logger.info("Playwright 浏览器已启动")
+    
+    async def _get_pool(self, width: int, scale: int) -> _PagePool:
+        """获取 (宽度, 缩放) 对应的上下文，不存在时创建"""
+        if not PLAYWRIGHT_AVAILABLE:
+            raise RuntimeError("playwright 未安装")
+        
+        key = (width, scale)
+        pool = self._pools.get(key)
+        if pool is not None and self._browser_ready():
+            return pool
+        
+        # 加锁后再检查一次，并发请求同一宽度时只创建一个上下文
+        async with self._get_browser_lock():
+            await self._launch_browser()
+            pool = self._pools.get(key)
+            if pool is None:
+                context = await self._browser.new_context(
+                    viewport={'width': width, 'height': VIEWPORT_HEIGHT},
+                    device_scale_factor=scale
+                )
+                pool = self._pools[key] = _PagePool(context)
+                logger.info(f"Playwright 浏览器上下文已创建: width={width}, scale={scale}")
+        return pool
+    
+    async def _new_page(self, pool: _PagePool):
+        """新建页面并加载 shell.html 预热字体"""
+        page = await pool.context.new_page()
+        shell = TEMPLATE_DIR / "shell.html"
+        if shell.exists():
+            try:
+                await page.goto(shell.as_uri(), wait_until='networkidle')
+            except Exception as e:
+                logger.debug(f"预热页面加载失败: {e}")
+        return page
+    
+    async def _acquire_page(self, pool: _PagePool):
+        """从页面池取出空闲页面，池未满时新建"""
+        try:
+            page = pool.idle.get_nowait()
+        except asyncio.QueueEmpty:
+            if pool.size < PAGE_POOL_SIZE:
+                pool.size += 1
+                page = None
+            else:
+                page = await pool.idle.get()
+        
+        if page is not None:
+            return page
+        
+        # None 表示一个空出的名额（池未满或已关闭页面让出），由当前调用方新建页面
+        try:
+            return await self._new_page(pool)
+        except Exception:
+            # 名额放回队列，正在等待的调用方可以接着重试
+            pool.idle.put_nowait(None)
+            raise
+    
+    @staticmethod
+    def _release_page(pool: _PagePool, page):
+        """归还页面，已关闭的页面让出名额，唤醒一个等待中的调用方新建页面"""
+        pool.idle.put_nowait(None if page.is_closed() else page)
+    
+    async def warmup(self):
+        """启动预热：拉起浏览器，并为常用宽度各准备一个已加载字体的页面"""
+        if not PLAYWRIGHT_AVAILABLE:
+            return
+        
+        start = time.perf_counter()
+        try:
+            await self._ensure_browser()
+            pools = await asyncio.gather(*(self._get_pool(w, 2) for w in WARMUP_WIDTHS))
+            
+            async def _prepare(pool: _PagePool):
+                if pool.size == 0:
+                    page = await self._acquire_page(pool)
+                    self._release_page(pool, page)
+            
+            await asyncio.gather(*(_prepare(pool) for pool in pools))
+            logger.info(f"渲染器预热完成，耗时 {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.warning(f"渲染器预热失败，将在首次渲染时重试: {e}")
     
     async def render_template(self, template_name: str, **context) -> str:
-        """渲染 Jinja2 模板"""
+        """渲染 Jinja2 模板（在线程池中执行，避免大列表渲染阻塞事件循环）"""
         if not JINJA2_AVAILABLE:
             raise RuntimeError("jinja2 未安装")
         
         template = self._env.get_template(template_name)
-        return await template.render_async(**context)
+        return await asyncio.to_thread(template.render, **context)
     
-    async def render_html_to_image(self, html: str, width: int = 800) -> Optional[io.BytesIO]:
+    async def render_html_to_image(self, html: str, width: int = 800, scale: int = 2) -> Optional[bytes]:
         """将 HTML 渲染为图片"""
         try:
-            await self._ensure_browser()
-            
-            page = await self._context.new_page()
+            pool = await self._get_pool(width, scale)
+            page = await self._acquire_page(pool)
             
             try:
-                # 设置视口宽度
-                await page.set_viewport_size({'width': width, 'height': 100})
-                
                 # 设置内容
                 await page.set_content(html, wait_until='networkidle')
                 
                 # 等待图片和字体加载
                 await asyncio.sleep(0.3)
                 
-                # 获取实际内容高度
-                content_height = await page.evaluate('document.body.scrollHeight')
-                await page.set_viewport_size({'width': width, 'height': min(content_height + 40, 4000)})
-                
-                # 截图
-                screenshot = await page.screenshot(type='png', full_page=True)
-                
-                return io.BytesIO(screenshot)
+                # 按实际内容高度裁剪截图（直接返回 bytes，由调用方按需包装）
+                content_height = await page.evaluate(CONTENT_HEIGHT_JS)
+                return await page.screenshot(
+                    type='png',
+                    full_page=True,
+                    clip={'x': 0, 'y': 0, 'width': width, 'height': min(content_height, MAX_IMAGE_HEIGHT)}
+                )
                 
             finally:
-                await page.close()
+                self._release_page(pool, page)
                 
         except Exception as e:
             logger.error(f"HTML 渲染失败: {e}")
             return None
     
-    async def render_template_to_image(self, template_name: str, width: int = 800, **context) -> Optional[io.BytesIO]:
-        """渲染模板并转为图片"""
+    async def render_template_to_image(self, template_name: str, width: int = 800, **context) -> Optional[bytes]:
+        """渲染模板并转为图片（相同输入在缓存有效期内直接返回上次结果）"""
+        try:
+            key = (template_name, width, content_key(context))
+        except (TypeError, ValueError):
+            key = None  # 上下文无法序列化时不缓存
+        
+        if key is not None:
+            cached = self._image_cache.get(key)
+            if cached is not None:
+                logger.debug(f"命中图片缓存: {template_name}")
+                return cached
+        
         try:
             html = await self.render_template(template_name, **context)
-            return await self.render_html_to_image(html, width)
+            image = await self.render_html_to_image(html, width)
         except Exception as e:
             logger.error(f"模板渲染失败: {e}")
             return None
+        
+        if image is not None and key is not None:
+            self._image_cache.set(key, image)
+        return image
     
     async def close(self):
-        """关闭浏览器（静默处理异常）"""
+        """关闭浏览器（静默处理异常；等待进行中的启动完成后再关闭）"""
         try:
-            if self._context:
-                try:
-                    await self._context.close()
-                except Exception:
-                    pass  # 忽略已关闭的错误
-                self._context = None
-            if self._browser:
-                try:
-                    await self._browser.close()
-                except Exception:
-                    pass
-                self._browser = None
-            if self._playwright:
-                try:
-                    await self._playwright.stop()
-                except Exception:
-                    pass
-                self._playwright = None
+            async with self._get_browser_lock():
+                for pool in self._pools.values():
+                    try:
+                        await pool.context.close()
+                    except Exception:
+                        pass  # 忽略已关闭的错误
+                TemplateRenderer._pools = {}
+                if self._browser:
+                    try:
+                        await self._browser.close()
+                    except Exception:
+                        pass
+                    self._browser = None
+                if self._playwright:
+                    try:
+                        await self._playwright.stop()
+                    except Exception:
+                        pass
+                    self._playwright = None
         except Exception:
             pass  # 静默处理所有关闭异常
     
@@ -160,7 +366,7 @@ class TemplateRenderer:
         hourly_stats: Dict[int, int],
         badges: List[Dict],
         word_cloud: List[Tuple[str, int]] = None
-    ) -> Optional[io.BytesIO]:
+    ) -> Optional[bytes]:
         """渲染用户画像"""
         max_hourly = max(hourly_stats.values()) if hourly_stats else 1
         
@@ -171,13 +377,12 @@ class TemplateRenderer:
             nickname=nickname,
             user_type=user_type,
             total_messages=total_messages,
-            daily_avg=f"{daily_avg:.1f}",
+            daily_avg=daily_avg,
             active_days=active_days,
             hourly_stats=hourly_stats,
             max_hourly=max_hourly,
             badges=badges,
-            word_cloud=word_cloud or [],
-            timestamp=time.strftime('%H:%M')
+            word_cloud=word_cloud or []
         )
     
     async def render_sentiment(
@@ -191,7 +396,7 @@ class TemplateRenderer:
         sentiment_score: float,
         keywords: List[Tuple[str, float]],
         total_messages: int
-    ) -> Optional[io.BytesIO]:
+    ) -> Optional[bytes]:
         """渲染情感分析报告"""
         return await self.render_template_to_image(
             'sentiment.html',
@@ -204,18 +409,28 @@ class TemplateRenderer:
             negative_pct=negative_pct * 100,
             sentiment_score=sentiment_score,
             keywords=keywords,
-            total_messages=total_messages,
-            timestamp=time.strftime('%H:%M')
+            total_messages=total_messages
         )
     
     async def render_repeater(
         self,
         repeats: List[Dict],
         total_messages: int
-    ) -> Optional[io.BytesIO]:
+    ) -> Optional[bytes]:
         """渲染复读机报告"""
-        total_repeats = sum(r['count'] for r in repeats)
-        total_users = len(set(u for r in repeats for u in r.get('users', [])))
+        total_repeats = sum(map(itemgetter('count'), repeats))
+        total_users = len(set().union(*(r.get('users', ()) for r in repeats)))
+        
+        img = await self._render_lite(
+            'render_repeater',
+            repeats=repeats,
+            total_repeats=total_repeats,
+            total_users=total_users,
+            total_messages=total_messages,
+            timestamp=now()
+        )
+        if img is not None:
+            return img
         
         return await self.render_template_to_image(
             'repeater.html',
@@ -223,8 +438,7 @@ class TemplateRenderer:
             repeats=repeats,
             total_repeats=total_repeats,
             total_users=total_users,
-            total_messages=total_messages,
-            timestamp=time.strftime('%H:%M')
+            total_messages=total_messages
         )
     
     async def render_report(
@@ -240,7 +454,7 @@ class TemplateRenderer:
         hot_words: List[Tuple[str, int]],
         image_count: int,
         days: int
-    ) -> Optional[io.BytesIO]:
+    ) -> Optional[bytes]:
         """渲染周报/月报"""
         if period_type == 'week':
             icon = '📅'
@@ -262,15 +476,14 @@ class TemplateRenderer:
             date_range=date_range,
             total_messages=total_messages,
             active_users=active_users,
-            daily_avg=f"{daily_avg:.0f}",
+            daily_avg=daily_avg,
             peak_day=peak_day,
             top_users=top_users,
             daily_stats=daily_stats,
             max_daily=max_daily,
             hot_words=hot_words,
             image_count=image_count,
-            days=days,
-            timestamp=time.strftime('%H:%M')
+            days=days
         )
     
     async def render_recall(
@@ -278,7 +491,7 @@ class TemplateRenderer:
         ranking: List[Tuple[int, int]],
         user_names: Dict[int, str],
         days: int = 7
-    ) -> Optional[io.BytesIO]:
+    ) -> Optional[bytes]:
         """渲染撤回统计报告
         
         Args:
@@ -296,17 +509,27 @@ class TemplateRenderer:
                 'count': count
             })
         
-        total_recalls = sum(count for _, count in ranking)
+        total_recalls = sum(map(itemgetter(1), ranking))
         total_users = len(ranking)
         
+        img = await self._render_lite(
+            'render_recall',
+            ranking=ranking_data,
+            total_recalls=total_recalls,
+            total_users=total_users,
+            days=days,
+            timestamp=now()
+        )
+        if img is not None:
+            return img
+        
         return await self.render_template_to_image(
             'recall.html',
             width=500,
             ranking=ranking_data,
             total_recalls=total_recalls,
             total_users=total_users,
-            days=days,
-            timestamp=time.strftime('%H:%M')
+            days=days
         )
 
 
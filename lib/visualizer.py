@@ -4,61 +4,380 @@
 使用 HTML 渲染 + Playwright 截图
 """
 
-import json
+import hashlib
 import logging
-import io
+import os
+import re
 import time
 import asyncio
-from typing import List, Tuple, Dict, Any, Optional
+import multiprocessing
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Tuple, Dict, Any, Optional, Mapping
 from collections import Counter
+from functools import lru_cache
+from heapq import nlargest
+from itertools import islice
+from operator import itemgetter
+
+from .renderer import LAUNCH_ARGS, VIEWPORT_HEIGHT, CONTENT_HEIGHT_JS, now
+from .async_utils import AvatarCache
+from .pillow_renderer import PillowCardRenderer
+from . import fastjson
+from .cache import TTLCache, content_key
 
 logger = logging.getLogger("Visualizer")
 
-# 尝试导入分词依赖
+# Jinja2 模板引擎（卡片片段使用预编译模板渲染）
 try:
-    import jieba
-    JIEBA_AVAILABLE = True
+    from jinja2 import DictLoader, Environment
+    from markupsafe import Markup
+    JINJA2_AVAILABLE = True
 except ImportError:
-    JIEBA_AVAILABLE = False
-    logger.warning("jieba 未安装，中文分词功能不可用")
+    JINJA2_AVAILABLE = False
+    logger.warning("jinja2 未安装，可视化卡片不可用")
+
+# 分词依赖延迟加载：导入和词典构建耗时较长，推迟到首次分词时进行
+_jieba = None
+_jieba_loaded = False
+
+
+def _get_jieba():
+    """
+    获取分词模块（优先使用 C 扩展版 jieba_fast，接口与 jieba 一致）
+    
+    首次调用时导入并构建词典，未安装时返回 None
+    """
+    global _jieba, _jieba_loaded
+    if not _jieba_loaded:
+        try:
+            import jieba_fast as module
+        except ImportError:
+            try:
+                import jieba as module
+            except ImportError:
+                module = None
+                logger.warning("jieba 未安装，中文分词功能不可用")
+        if module is not None:
+            module.initialize()
+        _jieba, _jieba_loaded = module, True
+    return _jieba
+
+
+def _segment(text: str, stop_words) -> List[str]:
+    """中文分词并过滤停用词（jieba 未安装时按空白切分）"""
+    jieba = _get_jieba()
+    if jieba is None:
+        return [w for w in text.split() if len(w) > 1]
+    
+    stripped = (w.strip() for w in jieba.lcut(text))
+    return [w for w in stripped if len(w) > 1 and w not in stop_words]
+
+
+# 分词子进程的停用词（由进程池 initializer 设置）
+_worker_stop_words: frozenset = frozenset()
+
+
+def _init_segment_worker(stop_words: frozenset):
+    """分词子进程初始化：保存停用词并预先构建词典"""
+    global _worker_stop_words
+    _worker_stop_words = stop_words
+    _get_jieba()
+
+
+def _segment_and_count(text: str) -> Tuple[Counter, int]:
+    """在分词子进程中执行：分词并统计词频，返回 (词频 Counter, 总词数)"""
+    words = _segment(text, _worker_stop_words)
+    return Counter(words), len(words)
+
+
+def __getattr__(name: str):
+    """模块级延迟属性：jieba / JIEBA_AVAILABLE 在首次访问时才加载"""
+    if name == 'jieba':
+        return _get_jieba()
+    if name == 'JIEBA_AVAILABLE':
+        return _get_jieba() is not None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# 文字摘要的分隔线
+_HR = "─" * 20
+
+# 未提供昵称映射时共用的只读空映射
+_EMPTY_NAMES: Mapping[int, str] = MappingProxyType({})
+
+
+@lru_cache(maxsize=1)
+def _datetime_label(second: int) -> str:
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+
+
+def _now_full() -> str:
+    """当前时间 YYYY-mm-dd HH:MM:SS（同一秒内复用格式化结果）"""
+    return _datetime_label(int(time.time()))
+
 
 # Playwright 浏览器实例（延迟初始化）
 _browser = None
 _playwright = None
+_context = None
+_page_pool: Optional[asyncio.Queue] = None  # 预热好的空闲页面
+_browser_lock = asyncio.Lock()
+
+# 空闲回收：最后一次使用后超过该时长（秒）自动关闭浏览器以释放内存
+BROWSER_IDLE_TIMEOUT = 600
+_idle_handle: Optional[asyncio.TimerHandle] = None
+_reap_task: Optional[asyncio.Task] = None
+_in_flight = 0  # 正在使用中的页面数
+
+# Google Fonts 响应缓存：url -> (状态码, 响应头, 内容)，进程内只下载一次
+_FONT_CACHE: Dict[str, Tuple[int, Dict[str, str], bytes]] = {}
+_FONT_URL_PATTERN = re.compile(r'^https://fonts\.(googleapis|gstatic)\.com/')
+
+# QQ 头像缓存：拦截 qlogo 请求，从本地缓存返回
+avatar_cache = AvatarCache()
+_AVATAR_URL_PATTERN = re.compile(r'^https://q\d*\.qlogo\.cn/')
+_AVATAR_UID_PATTERN = re.compile(r'[?&]nk=(\d+)')
+
+# 等待两帧，确保 canvas 绘制已提交
+RAF_JS = "() => new Promise(r => requestAnimationFrame(() => requestAnimationFrame(r)))"
+
+# 24 小时柱状图绘制脚本：字体就绪后在 canvas 上一次性绘制全部柱子
+HOURLY_CHART_JS = """
+(() => {
+    const canvas = document.currentScript.previousElementSibling;
+    const counts = %(counts)s, peak = %(peak)d;
+    const draw = () => {
+        const dpr = window.devicePixelRatio || 1;
+        const w = canvas.clientWidth, h = canvas.clientHeight;
+        canvas.width = w * dpr;
+        canvas.height = h * dpr;
+        const ctx = canvas.getContext('2d');
+        ctx.scale(dpr, dpr);
+        ctx.textAlign = 'center';
+
+        const max = Math.max(...counts, 1);
+        const gap = 4, col = (w - gap * 23) / 24;
+        const top = 16, chartH = h - top - 28;
+        counts.forEach((c, i) => {
+            const isPeak = i === peak && c > 0;
+            const x = i * (col + gap), bw = col * 0.7, bx = x + (col - bw) / 2;
+            const bh = Math.max(chartH * Math.max(c / max, 0.02), 4);
+            const by = top + chartH - bh;
+            const g = ctx.createLinearGradient(0, by, 0, by + bh);
+            g.addColorStop(0, isPeak ? '#FF6B6B' : '#6750A4');
+            g.addColorStop(1, isPeak ? '#FFE66D' : '#9A82DB');
+            ctx.fillStyle = g;
+            ctx.beginPath();
+            ctx.roundRect(bx, by, bw, bh, [4, 4, 0, 0]);
+            ctx.fill();
+
+            ctx.fillStyle = isPeak ? '#6750A4' : '#79747E';
+            ctx.font = (isPeak ? '700' : '500') + " 11px 'Noto Sans SC', sans-serif";
+            ctx.fillText(String(i).padStart(2, '0'), x + col / 2, h - 8);
+            if (isPeak) {
+                ctx.font = "600 10px 'Noto Sans SC', sans-serif";
+                ctx.fillText(String(c), x + col / 2, by - 4);
+            }
+        });
+    };
+    document.fonts.ready.then(draw);
+})();
+"""
+
+# 页面池大小（同时进行的截图数量上限）
+PAGE_POOL_SIZE = 4
+
+# Pillow 绘制线程数与排队上限（Pillow 绘制/编码时释放 GIL，可多核并行）
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
+RENDER_CONCURRENCY = 8
+
+# 分词进程数：jieba 为纯 Python 实现，放到子进程中才不受 GIL 限制；为 0 时在线程中分词
+SEGMENT_WORKERS = min(2, os.cpu_count() or 1)
+
+# 等待图片（加载成功或失败均可）与字体就绪，最多 3 秒
+# 用 addEventListener 监听，不覆盖模板中内联的 onerror 占位图回退
+READY_JS = """async () => {
+    const images = Array.from(document.images, img => img.complete ? null :
+        new Promise(resolve => {
+            img.addEventListener('load', resolve, {once: true});
+            img.addEventListener('error', resolve, {once: true});
+        }));
+    const ready = Promise.all(images).then(() => document.fonts.ready);
+    await Promise.race([ready, new Promise(resolve => setTimeout(resolve, 3000))]);
+}"""
+
+
+async def _serve_font(route):
+    """拦截字体请求：命中缓存直接返回，否则下载一次后缓存"""
+    url = route.request.url
+    cached = _FONT_CACHE.get(url)
+    if cached is None:
+        try:
+            response = await route.fetch()
+            cached = (response.status, response.headers, await response.body())
+        except Exception as e:
+            logger.debug(f"字体下载失败，使用系统字体: {e}")
+            await route.abort()
+            return
+        if cached[0] == 200:
+            _FONT_CACHE[url] = cached
+    
+    status, headers, body = cached
+    await route.fulfill(status=status, headers=headers, body=body)
+
+
+async def _serve_avatar(route):
+    """拦截头像请求，从头像缓存返回；获取失败时中止请求，由页面显示占位图"""
+    match = _AVATAR_UID_PATTERN.search(route.request.url)
+    data = await avatar_cache.get(int(match.group(1))) if match else None
+    if data is None:
+        await route.abort()
+        return
+    await route.fulfill(status=200, content_type='image/jpeg', body=data)
 
 
 async def get_browser():
-    """获取或创建浏览器实例"""
-    global _browser, _playwright
-    if _browser is None:
-        from playwright.async_api import async_playwright
-        _playwright = await async_playwright().start()
-        _browser = await _playwright.chromium.launch(headless=True)
-        logger.info("Playwright 浏览器已启动")
+    """获取或创建浏览器实例，同时初始化共享上下文和页面池"""
+    global _browser, _playwright, _context, _page_pool
+    async with _browser_lock:
+        if _browser is None:
+            from playwright.async_api import async_playwright
+            _playwright = await async_playwright().start()
+            _browser = await _playwright.chromium.launch(
+                headless=True,
+                args=LAUNCH_ARGS,
+                chromium_sandbox=False,
+                handle_sigint=False,
+                handle_sigterm=False,
+                handle_sighup=False
+            )
+            # 所有页面共用一个上下文，字体/头像等 HTTP 缓存在多次渲染间保持有效
+            _context = await _browser.new_context(
+                viewport={'width': 800, 'height': VIEWPORT_HEIGHT},
+                java_script_enabled=True,
+                bypass_csp=True
+            )
+            await _context.route(_FONT_URL_PATTERN, _serve_font)
+            await _context.route(_AVATAR_URL_PATTERN, _serve_avatar)
+            
+            _page_pool = asyncio.Queue()
+            for _ in range(PAGE_POOL_SIZE):
+                _page_pool.put_nowait(await _context.new_page())
+            logger.info(f"Playwright 浏览器已启动 (页面池: {PAGE_POOL_SIZE})")
     return _browser
 
 
-async def html_to_image(html_content: str, width: int = 800) -> Optional[io.BytesIO]:
-    """将 HTML 渲染为图片"""
+def _reset_idle_timer():
+    """重新计时空闲回收（每次使用浏览器后调用）"""
+    global _idle_handle
+    if _idle_handle is not None:
+        _idle_handle.cancel()
+    _idle_handle = asyncio.get_running_loop().call_later(BROWSER_IDLE_TIMEOUT, _on_idle_timeout)
+
+
+def _on_idle_timeout():
+    global _idle_handle, _reap_task
+    _idle_handle = None
+    _reap_task = asyncio.create_task(_reap_idle_browser())
+
+
+async def _reap_idle_browser():
+    """空闲超时后关闭浏览器；仍有截图进行中时跳过，等其结束后重新计时"""
+    async with _browser_lock:
+        if _browser is None or _in_flight:
+            return
+        logger.info(f"浏览器空闲超过 {BROWSER_IDLE_TIMEOUT} 秒，自动关闭以释放内存")
+        await _close_browser_unlocked()
+
+
+@asynccontextmanager
+async def acquire_page():
+    """从页面池借出一个页面，用完自动归还"""
+    global _in_flight
+    # 先登记占用，避免取页面期间浏览器被空闲回收
+    _in_flight += 1
     try:
-        browser = await get_browser()
-        page = await browser.new_page(viewport={'width': width, 'height': 100})
-        
-        await page.set_content(html_content, wait_until='networkidle')
-        
-        # 等待图片加载
-        await asyncio.sleep(0.5)
-        
-        # 获取内容实际高度
-        content_height = await page.evaluate('document.body.scrollHeight')
-        await page.set_viewport_size({'width': width, 'height': content_height + 40})
-        
-        # 截图
-        screenshot = await page.screenshot(type='png', full_page=True)
-        await page.close()
+        await get_browser()
+        pool, context = _page_pool, _context
+        page = await pool.get()
+        try:
+            # 页面崩溃或被关闭时，在共享上下文中重建，而不是新建隔离上下文
+            if page.is_closed():
+                page = await context.new_page()
+            yield page
+        finally:
+            pool.put_nowait(page)
+    finally:
+        _in_flight -= 1
+        _reset_idle_timer()
+
+
+async def _close_browser_unlocked():
+    """关闭浏览器及其上下文（调用方需持有 _browser_lock）"""
+    global _browser, _playwright, _context, _page_pool
+    for obj, method in ((_context, 'close'), (_browser, 'close'), (_playwright, 'stop')):
+        if obj is not None:
+            try:
+                await getattr(obj, method)()
+            except Exception:
+                pass
+    _browser = _playwright = _context = _page_pool = None
+
+
+async def close_browser():
+    """关闭浏览器（静默处理异常）"""
+    global _idle_handle
+    if _idle_handle is not None:
+        _idle_handle.cancel()
+        _idle_handle = None
+    async with _browser_lock:
+        await _close_browser_unlocked()
+
+
+async def html_to_image(html_content: str, width: int = 800,
+                        image_format: str = 'jpeg', quality: int = 85) -> Optional[bytes]:
+    """
+    将 HTML 渲染为图片
+    
+    Args:
+        html_content: 完整 HTML
+        width: 视口宽度
+        image_format: 'jpeg'（体积小，默认）或 'png'（无损）
+        quality: JPEG 质量 (1-100)
+    """
+    if image_format not in ('jpeg', 'png'):
+        raise ValueError(f"不支持的图片格式: {image_format}")
+    
+    options = {'type': image_format}
+    if image_format == 'jpeg':
+        options['quality'] = quality
+    
+    try:
+        async with acquire_page() as page:
+            # 固定的高视口只在宽度变化时调整一次，截图时再按内容裁剪
+            viewport = {'width': width, 'height': VIEWPORT_HEIGHT}
+            if page.viewport_size != viewport:
+                await page.set_viewport_size(viewport)
+            
+            await page.set_content(html_content, wait_until='domcontentloaded')
+            
+            # 等待头像和字体加载完成
+            await page.evaluate(READY_JS)
+            if '<canvas' in html_content:
+                await page.evaluate(RAF_JS)
+            
+            # 按内容实际高度裁剪截图（超出视口时依赖 full_page）
+            content_height = await page.evaluate(CONTENT_HEIGHT_JS)
+            screenshot = await page.screenshot(
+                **options,
+                full_page=True,
+                clip={'x': 0, 'y': 0, 'width': width, 'height': content_height}
+            )
         
-        buf = io.BytesIO(screenshot)
-        return buf
+        return screenshot
     except Exception as e:
         logger.error(f"HTML 渲染失败: {e}")
         return None
@@ -144,771 +463,814 @@ body {
 }
 """
 
+# 词频卡片样式（选择器限定在 .words-card 内，便于多张卡片拼在同一页面）
+WORD_FREQUENCY_CSS = """
+.words-card .word-item {
+    display: flex;
+    align-items: center;
+    gap: 16px;
+    padding: 12px 0;
+    border-bottom: 1px solid #F3EDF7;
+    contain: layout paint;
+}
 
-class StatsVisualizer:
-    """统计数据可视化器 - MD3 风格"""
-    
-    def __init__(self, font_path: str = None, stop_words: set = None):
-        self.font_path = font_path
-        self.stop_words = stop_words or set()
-    
-    def extract_text_from_messages(self, db_rows: List[Tuple]) -> str:
-        """从数据库记录中提取文本内容"""
-        corpus = []
-        for row in db_rows:
-            try:
-                # 兼容 sqlite3.Row 和普通 tuple
-                if hasattr(row, 'keys'):
-                    # sqlite3.Row 对象
-                    raw_content = row['raw_content'] if 'raw_content' in row.keys() else row[0]
-                elif isinstance(row, tuple):
-                    raw_content = row[0]
-                else:
-                    raw_content = row
-                
-                segments = json.loads(raw_content)
-                for seg in segments:
-                    if seg.get('type') == 'text':
-                        text = seg.get('data', {}).get('text', '').strip()
-                        if text:
-                            corpus.append(text)
-            except (json.JSONDecodeError, KeyError, TypeError, IndexError) as e:
-                logger.debug(f"解析消息内容失败: {e}, row={row}")
-                continue
-        
-        logger.info(f"从 {len(db_rows)} 条消息中提取到 {len(corpus)} 条文本")
-        return "\n".join(corpus)
-    
-    def segment_text(self, text: str) -> List[str]:
-        """中文分词并过滤停用词"""
-        if not JIEBA_AVAILABLE:
-            return [w for w in text.split() if len(w) > 1]
-        
-        words = jieba.lcut(text)
-        filtered_words = [
-            w.strip() for w in words 
-            if len(w.strip()) > 1 and w.strip() not in self.stop_words
-        ]
-        return filtered_words
-    
-    def _generate_word_frequency_html(self, top_words: List[Tuple], 
-                                       total_words: int) -> str:
-        """生成词频统计 HTML"""
-        max_count = top_words[0][1] if top_words else 1
-        
-        word_items = ""
-        for i, (word, count) in enumerate(top_words):
-            percentage = (count / max_count) * 100
-            gradient = GRADIENT_COLORS[i % len(GRADIENT_COLORS)]
-            
-            word_items += f"""
+.words-card .word-item:last-child {
+    border-bottom: none;
+}
+
+.words-card .word-rank {
+    width: 40px;
+    height: 40px;
+    border-radius: 12px;
+    background: linear-gradient(135deg, #F3EDF7, #E8DEF8);
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    font-weight: 700;
+    font-size: 14px;
+    color: #6750A4;
+    flex-shrink: 0;
+}
+
+.words-card .word-item:nth-child(1) .word-rank {
+    background: linear-gradient(135deg, #FFD700, #FFA500);
+    color: white;
+}
+
+.words-card .word-item:nth-child(2) .word-rank {
+    background: linear-gradient(135deg, #C0C0C0, #A8A8A8);
+    color: white;
+}
+
+.words-card .word-item:nth-child(3) .word-rank {
+    background: linear-gradient(135deg, #CD7F32, #B8860B);
+    color: white;
+}
+
+.words-card .word-content {
+    flex: 1;
+}
+
+.words-card .word-info {
+    display: flex;
+    justify-content: space-between;
+    margin-bottom: 8px;
+}
+
+.words-card .word-text {
+    font-size: 16px;
+    font-weight: 500;
+    color: #1D1B20;
+}
+
+.words-card .word-count {
+    font-size: 14px;
+    color: #49454F;
+    font-weight: 500;
+}
+
+.words-card .word-bar-bg {
+    height: 8px;
+    background: #F3EDF7;
+    border-radius: 4px;
+    overflow: hidden;
+    contain: strict;
+}
+
+/* 进度条铺满容器后用 scaleX 缩放，只走合成层，不触发重新排版 */
+.words-card .word-bar {
+    height: 100%;
+    border-radius: 4px;
+    transform-origin: left;
+    transform: scaleX(var(--p));
+}
+
+.words-card .stats-footer {
+    margin-top: 20px;
+    padding-top: 16px;
+    border-top: 1px solid #E7E0EC;
+    display: flex;
+    gap: 24px;
+}
+
+.words-card .stat-chip {
+    display: flex;
+    align-items: center;
+    gap: 8px;
+    padding: 8px 16px;
+    background: #F3EDF7;
+    border-radius: 20px;
+    font-size: 14px;
+    color: #49454F;
+}
+
+.words-card .stat-chip-icon {
+    font-size: 16px;
+}
+"""
+
+# 排行榜卡片样式（选择器限定在 .rank-card 内，便于多张卡片拼在同一页面）
+RANK_CSS = """
+.rank-card .rank-item {
+    display: flex;
+    align-items: center;
+    gap: 12px;
+    padding: 14px 16px;
+    margin-bottom: 10px;
+    background: #FAFAFA;
+    border-radius: 20px;
+    contain: layout;
+}
+
+.rank-card .rank-item:last-child {
+    margin-bottom: 0;
+}
+
+.rank-card .rank-item.top-1 {
+    background: linear-gradient(135deg, #FFF8E1, #FFECB3);
+    box-shadow: 0 4px 16px rgba(255, 193, 7, 0.2);
+}
+
+.rank-card .rank-item.top-2 {
+    background: linear-gradient(135deg, #FAFAFA, #F0F0F0);
+    box-shadow: 0 4px 16px rgba(158, 158, 158, 0.15);
+}
+
+.rank-card .rank-item.top-3 {
+    background: linear-gradient(135deg, #FFF3E0, #FFE0B2);
+    box-shadow: 0 4px 16px rgba(255, 152, 0, 0.15);
+}
+
+.rank-card .rank-position {
+    width: 36px;
+    flex-shrink: 0;
+    text-align: center;
+}
+
+.rank-card .rank-medal {
+    font-size: 24px;
+}
+
+.rank-card .rank-item:not(.top-1):not(.top-2):not(.top-3) .rank-medal {
+    font-size: 14px;
+    font-weight: 700;
+    color: #6750A4;
+    background: #F3EDF7;
+    border-radius: 10px;
+    padding: 6px 10px;
+}
+
+.rank-card .rank-avatar {
+    width: 48px;
+    height: 48px;
+    border-radius: 50%;
+    overflow: hidden;
+    flex-shrink: 0;
+    box-shadow: 0 2px 8px rgba(0, 0, 0, 0.12);
+    position: relative;
+    background: linear-gradient(135deg, #6750A4, #9A82DB);
+}
+
+.rank-card .rank-avatar img {
+    width: 100%;
+    height: 100%;
+    object-fit: cover;
+}
+
+.rank-card .avatar-fallback {
+    display: none;
+    width: 100%;
+    height: 100%;
+    align-items: center;
+    justify-content: center;
+    font-size: 24px;
+    background: linear-gradient(135deg, #6750A4, #9A82DB);
+}
+
+.rank-card .rank-info {
+    flex: 1;
+    min-width: 0;
+}
+
+.rank-card .rank-user-row {
+    display: flex;
+    justify-content: space-between;
+    align-items: center;
+    margin-bottom: 8px;
+}
+
+.rank-card .rank-nickname {
+    font-size: 15px;
+    font-weight: 600;
+    color: #1D1B20;
+    overflow: hidden;
+    text-overflow: ellipsis;
+    white-space: nowrap;
+    max-width: 150px;
+}
+
+.rank-card .rank-percentage {
+    font-size: 13px;
+    font-weight: 600;
+    color: #6750A4;
+    background: rgba(103, 80, 164, 0.1);
+    padding: 2px 8px;
+    border-radius: 10px;
+}
+
+.rank-card .rank-bar-container {
+    height: 8px;
+    background: rgba(103, 80, 164, 0.1);
+    border-radius: 4px;
+    overflow: hidden;
+    contain: strict;
+}
+
+.rank-card .rank-bar {
+    height: 100%;
+    border-radius: 4px;
+    transform-origin: left;
+    transform: scaleX(var(--p));
+}
+
+.rank-card .rank-count {
+    text-align: right;
+    flex-shrink: 0;
+    min-width: 50px;
+}
+
+.rank-card .count-number {
+    display: block;
+    font-size: 20px;
+    font-weight: 700;
+    color: #6750A4;
+    line-height: 1.2;
+}
+
+.rank-card .count-label {
+    font-size: 12px;
+    color: #79747E;
+}
+
+.rank-card .stats-footer {
+    margin-top: 20px;
+    padding-top: 16px;
+    border-top: 1px solid #E7E0EC;
+    display: flex;
+    justify-content: center;
+    gap: 24px;
+}
+
+.rank-card .stat-chip {
+    display: flex;
+    align-items: center;
+    gap: 8px;
+    padding: 8px 16px;
+    background: #F3EDF7;
+    border-radius: 20px;
+    font-size: 14px;
+    color: #49454F;
+}
+"""
+
+# 活跃度卡片样式（选择器限定在 .hourly-card 内，便于多张卡片拼在同一页面）
+HOURLY_CSS = """
+.hourly-card .hour-chart {
+    display: block;
+    width: 100%;
+    height: 200px;
+    margin-top: 20px;
+}
+
+.hourly-card .stats-summary {
+    display: flex;
+    gap: 16px;
+    margin-top: 24px;
+    padding-top: 20px;
+    border-top: 1px solid #E7E0EC;
+}
+
+.hourly-card .summary-card {
+    flex: 1;
+    padding: 16px;
+    background: linear-gradient(135deg, #F3EDF7, #E8DEF8);
+    border-radius: 16px;
+    text-align: center;
+}
+
+.hourly-card .summary-icon {
+    font-size: 24px;
+    margin-bottom: 8px;
+}
+
+.hourly-card .summary-value {
+    font-size: 24px;
+    font-weight: 700;
+    color: #6750A4;
+}
+
+.hourly-card .summary-label {
+    font-size: 12px;
+    color: #49454F;
+    margin-top: 4px;
+}
+"""
+
+# 统计概览卡片样式（选择器限定在 .overview-card 内，便于多张卡片拼在同一页面）
+STATS_CSS = """
+.overview-card .stats-grid {
+    display: grid;
+    grid-template-columns: repeat(2, 1fr);
+    gap: 16px;
+}
+
+.overview-card .stat-card {
+    padding: 24px;
+    border-radius: 24px;
+    text-align: center;
+    position: relative;
+    overflow: hidden;
+}
+
+.overview-card .stat-card:nth-child(1) {
+    background: linear-gradient(135deg, #E8DEF8, #D0BCFF);
+}
+
+.overview-card .stat-card:nth-child(2) {
+    background: linear-gradient(135deg, #D0F8CE, #A8E6CF);
+}
+
+.overview-card .stat-card:nth-child(3) {
+    background: linear-gradient(135deg, #FFE5D0, #FFCC80);
+}
+
+.overview-card .stat-card:nth-child(4) {
+    background: linear-gradient(135deg, #D4E5FF, #90CAF9);
+}
+
+.overview-card .stat-icon {
+    font-size: 40px;
+    margin-bottom: 12px;
+}
+
+.overview-card .stat-value {
+    font-size: 36px;
+    font-weight: 700;
+    color: #1D1B20;
+    margin-bottom: 4px;
+}
+
+.overview-card .stat-label {
+    font-size: 14px;
+    color: #49454F;
+    font-weight: 500;
+}
+
+.overview-card .footer-info {
+    margin-top: 20px;
+    padding: 16px;
+    background: #F3EDF7;
+    border-radius: 16px;
+    text-align: center;
+    font-size: 13px;
+    color: #49454F;
+}
+"""
+
+# 看板样式：多张卡片纵向排列
+DASHBOARD_CSS = """
+.card + .card {
+    margin-top: 24px;
+}
+"""
+
+
+def _page_head(*css_blocks: str) -> str:
+    """拼接页面头部（公共样式 + 卡片样式），只在模块加载时执行"""
+    return (
+        '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="UTF-8">\n<style>\n'
+        + BASE_CSS + ''.join(css_blocks)
+        + '</style>\n</head>\n<body>\n'
+    )
+
+
+# 预先拼接好的页面头部，渲染时只需拼入卡片片段
+WORD_FREQUENCY_PAGE = _page_head(WORD_FREQUENCY_CSS)
+RANK_PAGE = _page_head(RANK_CSS)
+HOURLY_PAGE = _page_head(HOURLY_CSS)
+STATS_PAGE = _page_head(STATS_CSS)
+DASHBOARD_PAGE = _page_head(WORD_FREQUENCY_CSS, RANK_CSS, HOURLY_CSS, DASHBOARD_CSS)
+PAGE_TAIL = '\n</body>\n</html>\n'
+
+
+# ==================== 卡片模板（模块加载时编译一次） ====================
+CARD_HEADER_TMPL = """
+            <div class="card-header">
+                <div class="card-icon">{{ icon }}</div>
+                <div>
+                    <div class="card-title">{{ title }}</div>
+                    <div class="card-subtitle">{{ subtitle }}</div>
+                </div>
+                <div class="timestamp">{{ timestamp }}</div>
+            </div>
+"""
+
+WORD_FREQUENCY_TMPL = """
+        <div class="card words-card">
+            {%- with icon='📊', title='今日热词统计', subtitle='群聊高频词汇排行' %}{% include 'header' %}{% endwith %}
+
+            <div class="word-list">
+            {% for word, count in top_words %}
+            {% set gradient = gradients[loop.index0 % gradients|length] %}
             <div class="word-item">
-                <div class="word-rank">#{i + 1}</div>
+                <div class="word-rank">#{{ loop.index }}</div>
                 <div class="word-content">
                     <div class="word-info">
-                        <span class="word-text">{word}</span>
-                        <span class="word-count">{count} 次</span>
+                        <span class="word-text">{{ word }}</span>
+                        <span class="word-count">{{ count }} 次</span>
                     </div>
                     <div class="word-bar-bg">
-                        <div class="word-bar" style="width: {percentage}%; background: linear-gradient(90deg, {gradient[0]}, {gradient[1]});"></div>
+                        <div class="word-bar" style="--p: {{ '%.4f' % (count / max_count) }}; background: linear-gradient(90deg, {{ gradient[0] }}, {{ gradient[1] }});"></div>
                     </div>
                 </div>
             </div>
-            """
-        
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                {BASE_CSS}
-                
-                .word-item {{
-                    display: flex;
-                    align-items: center;
-                    gap: 16px;
-                    padding: 12px 0;
-                    border-bottom: 1px solid #F3EDF7;
-                }}
-                
-                .word-item:last-child {{
-                    border-bottom: none;
-                }}
-                
-                .word-rank {{
-                    width: 40px;
-                    height: 40px;
-                    border-radius: 12px;
-                    background: linear-gradient(135deg, #F3EDF7, #E8DEF8);
-                    display: flex;
-                    align-items: center;
-                    justify-content: center;
-                    font-weight: 700;
-                    font-size: 14px;
-                    color: #6750A4;
-                    flex-shrink: 0;
-                }}
-                
-                .word-item:nth-child(1) .word-rank {{
-                    background: linear-gradient(135deg, #FFD700, #FFA500);
-                    color: white;
-                }}
-                
-                .word-item:nth-child(2) .word-rank {{
-                    background: linear-gradient(135deg, #C0C0C0, #A8A8A8);
-                    color: white;
-                }}
-                
-                .word-item:nth-child(3) .word-rank {{
-                    background: linear-gradient(135deg, #CD7F32, #B8860B);
-                    color: white;
-                }}
-                
-                .word-content {{
-                    flex: 1;
-                }}
-                
-                .word-info {{
-                    display: flex;
-                    justify-content: space-between;
-                    margin-bottom: 8px;
-                }}
-                
-                .word-text {{
-                    font-size: 16px;
-                    font-weight: 500;
-                    color: #1D1B20;
-                }}
-                
-                .word-count {{
-                    font-size: 14px;
-                    color: #49454F;
-                    font-weight: 500;
-                }}
-                
-                .word-bar-bg {{
-                    height: 8px;
-                    background: #F3EDF7;
-                    border-radius: 4px;
-                    overflow: hidden;
-                }}
-                
-                .word-bar {{
-                    height: 100%;
-                    border-radius: 4px;
-                    transition: width 0.3s ease;
-                }}
-                
-                .stats-footer {{
-                    margin-top: 20px;
-                    padding-top: 16px;
-                    border-top: 1px solid #E7E0EC;
-                    display: flex;
-                    gap: 24px;
-                }}
-                
-                .stat-chip {{
-                    display: flex;
-                    align-items: center;
-                    gap: 8px;
-                    padding: 8px 16px;
-                    background: #F3EDF7;
-                    border-radius: 20px;
-                    font-size: 14px;
-                    color: #49454F;
-                }}
-                
-                .stat-chip-icon {{
-                    font-size: 16px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="card">
-                <div class="card-header">
-                    <div class="card-icon">📊</div>
-                    <div>
-                        <div class="card-title">今日热词统计</div>
-                        <div class="card-subtitle">群聊高频词汇排行</div>
-                    </div>
-                    <div class="timestamp">{time.strftime('%H:%M')}</div>
+            {% endfor %}
+            </div>
+
+            <div class="stats-footer">
+                <div class="stat-chip">
+                    <span class="stat-chip-icon">💬</span>
+                    <span>共分析 {{ total_words }} 个词</span>
                 </div>
-                
-                <div class="word-list">
-                    {word_items}
-                </div>
-                
-                <div class="stats-footer">
-                    <div class="stat-chip">
-                        <span class="stat-chip-icon">💬</span>
-                        <span>共分析 {total_words} 个词</span>
-                    </div>
-                    <div class="stat-chip">
-                        <span class="stat-chip-icon">🔥</span>
-                        <span>Top {len(top_words)} 热词</span>
-                    </div>
+                <div class="stat-chip">
+                    <span class="stat-chip-icon">🔥</span>
+                    <span>Top {{ top_words|length }} 热词</span>
                 </div>
             </div>
-        </body>
-        </html>
-        """
-        return html
-    
-    def _generate_rank_html(self, user_stats: List[Dict], total_messages: int, total_users: int) -> str:
-        """
-        生成用户排行榜 HTML
-        
-        Args:
-            user_stats: [{'user_id': 123, 'count': 50, 'nickname': '昵称'}, ...]
-            total_messages: 今日总消息数
-            total_users: 今日参与人数
-        """
-        rank_items = ""
-        medals = ['🥇', '🥈', '🥉']
-        
-        for i, user in enumerate(user_stats[:10]):
-            user_id = user['user_id']
-            count = user['count']
-            nickname = user.get('nickname') or str(user_id)
-            
-            # 计算占总消息的百分比
-            percentage = (count / total_messages * 100) if total_messages > 0 else 0
-            gradient = GRADIENT_COLORS[i % len(GRADIENT_COLORS)]
-            medal = medals[i] if i < 3 else ""
-            
-            # 为前三名添加特殊样式
-            special_class = f"top-{i + 1}" if i < 3 else ""
-            
-            # 排名显示
-            rank_display = medal if i < 3 else f"#{i + 1}"
-            
-            rank_items += f"""
-            <div class="rank-item {special_class}">
+        </div>
+"""
+
+RANK_TMPL = """
+        <div class="card rank-card">
+            {%- with icon='👑', title='今日发言排行', subtitle='活跃用户 TOP %d' % users|length %}{% include 'header' %}{% endwith %}
+
+            <div class="rank-list">
+            {% for user in users %}
+            {% set gradient = gradients[loop.index0 % gradients|length] %}
+            {% set percentage = user.count / total_messages * 100 if total_messages > 0 else 0 %}
+            <div class="rank-item {{ 'top-%d' % loop.index if loop.index <= 3 }}">
                 <div class="rank-position">
-                    <span class="rank-medal">{rank_display}</span>
+                    <span class="rank-medal">{{ medals[loop.index0] if loop.index <= 3 else '#%d' % loop.index }}</span>
                 </div>
                 <div class="rank-avatar">
-                    <img src="https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=100" alt="avatar" 
+                    <img src="https://q1.qlogo.cn/g?b=qq&nk={{ user.user_id }}&s=100" alt="avatar" 
                          onerror="this.style.display='none'; this.nextElementSibling.style.display='flex';">
                     <div class="avatar-fallback">👤</div>
                 </div>
                 <div class="rank-info">
                     <div class="rank-user-row">
-                        <span class="rank-nickname">{nickname}</span>
-                        <span class="rank-percentage">{percentage:.1f}%</span>
+                        {# 截断昵称，防止超长昵称破坏布局 #}
+                        <span class="rank-nickname">{{ ((user.nickname or user.user_id)|string)[:24] }}</span>
+                        <span class="rank-percentage">{{ '%.1f' % percentage }}%</span>
                     </div>
                     <div class="rank-bar-container">
-                        <div class="rank-bar" style="width: {percentage}%; background: linear-gradient(90deg, {gradient[0]}, {gradient[1]});"></div>
+                        <div class="rank-bar" style="--p: {{ '%.4f' % ([percentage, 1]|max / 100) }}; background: linear-gradient(90deg, {{ gradient[0] }}, {{ gradient[1] }});"></div>
                     </div>
                 </div>
                 <div class="rank-count">
-                    <span class="count-number">{count}</span>
+                    <span class="count-number">{{ user.count }}</span>
                     <span class="count-label">条</span>
                 </div>
             </div>
-            """
-        
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                {BASE_CSS}
-                
-                .rank-item {{
-                    display: flex;
-                    align-items: center;
-                    gap: 12px;
-                    padding: 14px 16px;
-                    margin-bottom: 10px;
-                    background: #FAFAFA;
-                    border-radius: 20px;
-                    transition: all 0.2s ease;
-                }}
-                
-                .rank-item:last-child {{
-                    margin-bottom: 0;
-                }}
-                
-                .rank-item.top-1 {{
-                    background: linear-gradient(135deg, #FFF8E1, #FFECB3);
-                    box-shadow: 0 4px 16px rgba(255, 193, 7, 0.2);
-                }}
-                
-                .rank-item.top-2 {{
-                    background: linear-gradient(135deg, #FAFAFA, #F0F0F0);
-                    box-shadow: 0 4px 16px rgba(158, 158, 158, 0.15);
-                }}
-                
-                .rank-item.top-3 {{
-                    background: linear-gradient(135deg, #FFF3E0, #FFE0B2);
-                    box-shadow: 0 4px 16px rgba(255, 152, 0, 0.15);
-                }}
-                
-                .rank-position {{
-                    width: 36px;
-                    flex-shrink: 0;
-                    text-align: center;
-                }}
-                
-                .rank-medal {{
-                    font-size: 24px;
-                }}
-                
-                .rank-item:not(.top-1):not(.top-2):not(.top-3) .rank-medal {{
-                    font-size: 14px;
-                    font-weight: 700;
-                    color: #6750A4;
-                    background: #F3EDF7;
-                    border-radius: 10px;
-                    padding: 6px 10px;
-                }}
-                
-                .rank-avatar {{
-                    width: 48px;
-                    height: 48px;
-                    border-radius: 50%;
-                    overflow: hidden;
-                    flex-shrink: 0;
-                    box-shadow: 0 2px 8px rgba(0, 0, 0, 0.12);
-                    position: relative;
-                    background: linear-gradient(135deg, #6750A4, #9A82DB);
-                }}
-                
-                .rank-avatar img {{
-                    width: 100%;
-                    height: 100%;
-                    object-fit: cover;
-                }}
-                
-                .avatar-fallback {{
-                    display: none;
-                    width: 100%;
-                    height: 100%;
-                    align-items: center;
-                    justify-content: center;
-                    font-size: 24px;
-                    background: linear-gradient(135deg, #6750A4, #9A82DB);
-                }}
-                
-                .rank-info {{
-                    flex: 1;
-                    min-width: 0;
-                }}
-                
-                .rank-user-row {{
-                    display: flex;
-                    justify-content: space-between;
-                    align-items: center;
-                    margin-bottom: 8px;
-                }}
-                
-                .rank-nickname {{
-                    font-size: 15px;
-                    font-weight: 600;
-                    color: #1D1B20;
-                    overflow: hidden;
-                    text-overflow: ellipsis;
-                    white-space: nowrap;
-                    max-width: 150px;
-                }}
-                
-                .rank-percentage {{
-                    font-size: 13px;
-                    font-weight: 600;
-                    color: #6750A4;
-                    background: rgba(103, 80, 164, 0.1);
-                    padding: 2px 8px;
-                    border-radius: 10px;
-                }}
-                
-                .rank-bar-container {{
-                    height: 8px;
-                    background: rgba(103, 80, 164, 0.1);
-                    border-radius: 4px;
-                    overflow: hidden;
-                }}
-                
-                .rank-bar {{
-                    height: 100%;
-                    border-radius: 4px;
-                    min-width: 4px;
-                }}
-                
-                .rank-count {{
-                    text-align: right;
-                    flex-shrink: 0;
-                    min-width: 50px;
-                }}
-                
-                .count-number {{
-                    display: block;
-                    font-size: 20px;
-                    font-weight: 700;
-                    color: #6750A4;
-                    line-height: 1.2;
-                }}
-                
-                .count-label {{
-                    font-size: 12px;
-                    color: #79747E;
-                }}
-                
-                .stats-footer {{
-                    margin-top: 20px;
-                    padding-top: 16px;
-                    border-top: 1px solid #E7E0EC;
-                    display: flex;
-                    justify-content: center;
-                    gap: 24px;
-                }}
-                
-                .stat-chip {{
-                    display: flex;
-                    align-items: center;
-                    gap: 8px;
-                    padding: 8px 16px;
-                    background: #F3EDF7;
-                    border-radius: 20px;
-                    font-size: 14px;
-                    color: #49454F;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="card">
-                <div class="card-header">
-                    <div class="card-icon">👑</div>
-                    <div>
-                        <div class="card-title">今日发言排行</div>
-                        <div class="card-subtitle">活跃用户 TOP {len(user_stats[:10])}</div>
-                    </div>
-                    <div class="timestamp">{time.strftime('%H:%M')}</div>
+            {% endfor %}
+            </div>
+
+            <div class="stats-footer">
+                <div class="stat-chip">
+                    <span>💬</span>
+                    <span>今日共 {{ total_messages }} 条消息</span>
                 </div>
-                
-                <div class="rank-list">
-                    {rank_items}
+                <div class="stat-chip">
+                    <span>👥</span>
+                    <span>{{ total_users }} 人参与</span>
                 </div>
-                
-                <div class="stats-footer">
-                    <div class="stat-chip">
-                        <span>💬</span>
-                        <span>今日共 {total_messages} 条消息</span>
-                    </div>
-                    <div class="stat-chip">
-                        <span>👥</span>
-                        <span>{total_users} 人参与</span>
-                    </div>
+            </div>
+        </div>
+"""
+
+HOURLY_TMPL = """
+        <div class="card hourly-card">
+            {%- with icon='⏰', title='24小时活跃度', subtitle='消息分布统计' %}{% include 'header' %}{% endwith %}
+
+            <canvas class="hour-chart"></canvas>
+            <script>{{ chart_js }}</script>
+
+            <div class="stats-summary">
+                <div class="summary-card">
+                    <div class="summary-icon">💬</div>
+                    <div class="summary-value">{{ total_count }}</div>
+                    <div class="summary-label">今日总消息</div>
+                </div>
+                <div class="summary-card">
+                    <div class="summary-icon">🔥</div>
+                    <div class="summary-value">{{ '%02d' % peak_hour }}:00</div>
+                    <div class="summary-label">最活跃时段</div>
+                </div>
+                <div class="summary-card">
+                    <div class="summary-icon">📈</div>
+                    <div class="summary-value">{{ peak_count }}</div>
+                    <div class="summary-label">峰值消息数</div>
+                </div>
+            </div>
+        </div>
+"""
+
+STATS_TMPL = """
+        <div class="card overview-card">
+            {%- with icon='📈', title='群聊统计概览', subtitle='数据统计摘要' %}{% include 'header' %}{% endwith %}
+
+            <div class="stats-grid">
+            {% for key, icon, label in stat_items %}
+                <div class="stat-card">
+                    <div class="stat-icon">{{ icon }}</div>
+                    <div class="stat-value">{{ '{:,}'.format(stats.get(key, 0)) }}</div>
+                    <div class="stat-label">{{ label }}</div>
                 </div>
+            {% endfor %}
+            </div>
+
+            <div class="footer-info">
+                统计时间：{{ generated_at }}
             </div>
-        </body>
-        </html>
+        </div>
+"""
+
+STAT_ITEMS = (
+    ('total_messages', '💬', '总消息数'),
+    ('today_messages', '📅', '今日消息'),
+    ('total_users', '👥', '活跃用户'),
+    ('total_images', '🖼️', '图片总数'),
+)
+
+if JINJA2_AVAILABLE:
+    _CARD_ENV = Environment(
+        loader=DictLoader({
+            'header': CARD_HEADER_TMPL,
+            'words': WORD_FREQUENCY_TMPL,
+            'rank': RANK_TMPL,
+            'hourly': HOURLY_TMPL,
+            'stats': STATS_TMPL,
+        }),
+        autoescape=True,
+        trim_blocks=True,
+        lstrip_blocks=True
+    )
+    _CARD_ENV.globals.update(gradients=GRADIENT_COLORS, medals=('🥇', '🥈', '🥉'), stat_items=STAT_ITEMS)
+    _CARD_TEMPLATES = {name: _CARD_ENV.get_template(name) for name in ('words', 'rank', 'hourly', 'stats')}
+else:
+    _CARD_TEMPLATES = {}
+
+
+def _render_card(name: str, **context) -> str:
+    """使用预编译模板渲染卡片片段（自动转义用户内容）"""
+    template = _CARD_TEMPLATES.get(name)
+    if template is None:
+        raise RuntimeError("jinja2 未安装")
+    return template.render(timestamp=now(), **context)
+
+
+class StatsVisualizer:
+    """统计数据可视化器 - MD3 风格"""
+    
+    def __init__(self, font_path: str = None, stop_words: set = None, avatar_dir: Path = None,
+                 pillow_charts: bool = True, segment_workers: int = SEGMENT_WORKERS):
         """
-        return html
+        Args:
+            font_path: 中文字体路径（Pillow 绘制使用）
+            stop_words: 停用词
+            avatar_dir: 头像磁盘缓存目录
+            pillow_charts: 发言排行和 24 小时活跃度优先使用 Pillow 直接绘制，
+                           关闭后始终走浏览器渲染
+            segment_workers: 分词子进程数，为 0 时在线程中分词
+        """
+        self.font_path = font_path
+        self.stop_words = stop_words or set()
+        self.pillow_charts = pillow_charts
+        self.segment_workers = segment_workers
+        # 分词进程池，首次分词时创建
+        self._segment_pool: Optional[ProcessPoolExecutor] = None
+        # 分词结果缓存：语料哈希 -> (词频 Counter, 总词数)
+        self._seg_cache = TTLCache(maxsize=16, ttl=24 * 3600)
+        # 渲染结果缓存：输入数据哈希 -> 图片字节，短时间内重复请求直接复用
+        self._image_cache = TTLCache(maxsize=64, ttl=60)
+        # 纯色块布局的卡片直接用 Pillow 绘制，无需浏览器
+        self._lite = PillowCardRenderer(font_path)
+        # Pillow 绘制使用独立线程池，不与默认线程池中的数据库查询争抢线程
+        self._render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="viz-render")
+        self._render_semaphore = asyncio.Semaphore(RENDER_CONCURRENCY)
+        if avatar_dir is not None:
+            avatar_cache.cache_dir = Path(avatar_dir)
     
-    def _generate_hourly_html(self, hourly_counts: Dict[int, int]) -> str:
-        """生成24小时活跃度 HTML"""
-        max_count = max(hourly_counts.values()) if hourly_counts else 1
-        total_count = sum(hourly_counts.values())
+    @staticmethod
+    def _row_texts(row) -> List[str]:
+        """解析单条记录的消息段，返回其中的文本"""
+        try:
+            # 兼容 sqlite3.Row / dict、普通 tuple 和原始 JSON（str 或 bytes）
+            if hasattr(row, 'keys'):
+                raw_content = row['raw_content'] if 'raw_content' in row.keys() else row[0]
+            elif isinstance(row, tuple):
+                raw_content = row[0]
+            else:
+                raw_content = row
+            
+            return [
+                seg['data']['text'].strip()
+                for seg in fastjson.loads(raw_content)
+                if seg.get('type') == 'text' and seg.get('data', {}).get('text')
+            ]
+        except (fastjson.JSONDecodeError, KeyError, TypeError, IndexError, AttributeError) as e:
+            logger.debug(f"解析消息内容失败: {e}, row={row}")
+            return []
+    
+    def extract_text_from_messages(self, db_rows: List[Tuple]) -> str:
+        """从数据库记录中提取文本内容"""
+        corpus = [text for row in db_rows for text in self._row_texts(row) if text]
         
+        logger.info(f"从 {len(db_rows)} 条消息中提取到 {len(corpus)} 条文本")
+        return "\n".join(corpus)
+    
+    def segment_text(self, text: str) -> List[str]:
+        """中文分词并过滤停用词"""
+        return _segment(text, self.stop_words)
+    
+    def _get_segment_pool(self) -> ProcessPoolExecutor:
+        """获取分词进程池（spawn 启动，避免 fork 复制浏览器和线程池状态）"""
+        if self._segment_pool is None:
+            self._segment_pool = ProcessPoolExecutor(
+                max_workers=self.segment_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_segment_worker,
+                initargs=(frozenset(self.stop_words),)
+            )
+        return self._segment_pool
+    
+    async def _segment_counts(self, text: str) -> Tuple[Counter, int]:
+        """分词并统计词频：优先在子进程中执行，进程池不可用时回退到线程"""
+        if self.segment_workers > 0:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._get_segment_pool(), _segment_and_count, text)
+            except (BrokenProcessPool, OSError) as e:
+                logger.warning(f"分词进程池不可用，改为线程内分词: {e}")
+                self._segment_pool = None
+                self.segment_workers = 0
+        
+        words = await asyncio.to_thread(self.segment_text, text)
+        return Counter(words), len(words)
+    
+    def _word_frequency_card(self, top_words: List[Tuple], 
+                             total_words: int) -> str:
+        """生成词频统计卡片片段"""
+        return _render_card(
+            'words',
+            top_words=top_words,
+            max_count=top_words[0][1] if top_words else 1,
+            total_words=total_words
+        )
+    
+    def _rank_card(self, user_stats: List[Dict], total_messages: int, total_users: int) -> str:
+        """
+        生成用户排行榜卡片片段
+        
+        Args:
+            user_stats: [{'user_id': 123, 'count': 50, 'nickname': '昵称'}, ...]
+            total_messages: 今日总消息数
+            total_users: 今日参与人数
+        """
+        return _render_card(
+            'rank',
+            users=user_stats[:10],
+            total_messages=total_messages,
+            total_users=total_users
+        )
+    
+    def _hourly_card(self, hourly_counts: Dict[int, int]) -> str:
+        """生成24小时活跃度卡片片段"""
         # 找出最活跃的时段
         peak_hour = max(hourly_counts, key=hourly_counts.get) if hourly_counts else 0
         
-        bars = ""
-        for hour in range(24):
-            count = hourly_counts.get(hour, 0)
-            percentage = (count / max_count * 100) if max_count > 0 else 0
-            is_peak = hour == peak_hour and count > 0
-            
-            bars += f"""
-            <div class="hour-col {'peak' if is_peak else ''}">
-                <div class="hour-bar-container">
-                    <div class="hour-bar" style="height: {max(percentage, 2)}%;"></div>
-                </div>
-                <div class="hour-label">{hour:02d}</div>
-                <div class="hour-count">{count}</div>
-            </div>
-            """
+        counts = [hourly_counts.get(hour, 0) for hour in range(24)]
+        chart_js = HOURLY_CHART_JS % {'counts': fastjson.dumps(counts), 'peak': peak_hour}
         
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                {BASE_CSS}
-                
-                .chart-container {{
-                    display: flex;
-                    align-items: flex-end;
-                    gap: 4px;
-                    height: 200px;
-                    padding: 20px 0;
-                }}
-                
-                .hour-col {{
-                    flex: 1;
-                    display: flex;
-                    flex-direction: column;
-                    align-items: center;
-                    gap: 8px;
-                }}
-                
-                .hour-bar-container {{
-                    flex: 1;
-                    width: 100%;
-                    display: flex;
-                    align-items: flex-end;
-                    justify-content: center;
-                }}
-                
-                .hour-bar {{
-                    width: 70%;
-                    background: linear-gradient(180deg, #6750A4, #9A82DB);
-                    border-radius: 4px 4px 0 0;
-                    min-height: 4px;
-                    transition: all 0.3s ease;
-                }}
-                
-                .hour-col.peak .hour-bar {{
-                    background: linear-gradient(180deg, #FF6B6B, #FFE66D);
-                    box-shadow: 0 0 20px rgba(255, 107, 107, 0.4);
-                }}
-                
-                .hour-label {{
-                    font-size: 11px;
-                    color: #79747E;
-                    font-weight: 500;
-                }}
-                
-                .hour-col.peak .hour-label {{
-                    color: #6750A4;
-                    font-weight: 700;
-                }}
-                
-                .hour-count {{
-                    font-size: 10px;
-                    color: #CAC4D0;
-                    display: none;
-                }}
-                
-                .hour-col.peak .hour-count {{
-                    display: block;
-                    color: #6750A4;
-                    font-weight: 600;
-                }}
-                
-                .stats-summary {{
-                    display: flex;
-                    gap: 16px;
-                    margin-top: 24px;
-                    padding-top: 20px;
-                    border-top: 1px solid #E7E0EC;
-                }}
-                
-                .summary-card {{
-                    flex: 1;
-                    padding: 16px;
-                    background: linear-gradient(135deg, #F3EDF7, #E8DEF8);
-                    border-radius: 16px;
-                    text-align: center;
-                }}
-                
-                .summary-icon {{
-                    font-size: 24px;
-                    margin-bottom: 8px;
-                }}
-                
-                .summary-value {{
-                    font-size: 24px;
-                    font-weight: 700;
-                    color: #6750A4;
-                }}
-                
-                .summary-label {{
-                    font-size: 12px;
-                    color: #49454F;
-                    margin-top: 4px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="card">
-                <div class="card-header">
-                    <div class="card-icon">⏰</div>
-                    <div>
-                        <div class="card-title">24小时活跃度</div>
-                        <div class="card-subtitle">消息分布统计</div>
-                    </div>
-                    <div class="timestamp">{time.strftime('%H:%M')}</div>
-                </div>
-                
-                <div class="chart-container">
-                    {bars}
-                </div>
-                
-                <div class="stats-summary">
-                    <div class="summary-card">
-                        <div class="summary-icon">💬</div>
-                        <div class="summary-value">{total_count}</div>
-                        <div class="summary-label">今日总消息</div>
-                    </div>
-                    <div class="summary-card">
-                        <div class="summary-icon">🔥</div>
-                        <div class="summary-value">{peak_hour:02d}:00</div>
-                        <div class="summary-label">最活跃时段</div>
-                    </div>
-                    <div class="summary-card">
-                        <div class="summary-icon">📈</div>
-                        <div class="summary-value">{hourly_counts.get(peak_hour, 0)}</div>
-                        <div class="summary-label">峰值消息数</div>
-                    </div>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        return html
+        return _render_card(
+            'hourly',
+            chart_js=Markup(chart_js),
+            total_count=sum(hourly_counts.values()),
+            peak_hour=peak_hour,
+            peak_count=hourly_counts.get(peak_hour, 0)
+        )
     
-    def _generate_stats_html(self, stats: Dict[str, Any]) -> str:
-        """生成统计概览 HTML"""
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                {BASE_CSS}
-                
-                .stats-grid {{
-                    display: grid;
-                    grid-template-columns: repeat(2, 1fr);
-                    gap: 16px;
-                }}
-                
-                .stat-card {{
-                    padding: 24px;
-                    border-radius: 24px;
-                    text-align: center;
-                    position: relative;
-                    overflow: hidden;
-                }}
-                
-                .stat-card:nth-child(1) {{
-                    background: linear-gradient(135deg, #E8DEF8, #D0BCFF);
-                }}
-                
-                .stat-card:nth-child(2) {{
-                    background: linear-gradient(135deg, #D0F8CE, #A8E6CF);
-                }}
-                
-                .stat-card:nth-child(3) {{
-                    background: linear-gradient(135deg, #FFE5D0, #FFCC80);
-                }}
-                
-                .stat-card:nth-child(4) {{
-                    background: linear-gradient(135deg, #D4E5FF, #90CAF9);
-                }}
-                
-                .stat-icon {{
-                    font-size: 40px;
-                    margin-bottom: 12px;
-                }}
-                
-                .stat-value {{
-                    font-size: 36px;
-                    font-weight: 700;
-                    color: #1D1B20;
-                    margin-bottom: 4px;
-                }}
-                
-                .stat-label {{
-                    font-size: 14px;
-                    color: #49454F;
-                    font-weight: 500;
-                }}
-                
-                .footer-info {{
-                    margin-top: 20px;
-                    padding: 16px;
-                    background: #F3EDF7;
-                    border-radius: 16px;
-                    text-align: center;
-                    font-size: 13px;
-                    color: #49454F;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="card">
-                <div class="card-header">
-                    <div class="card-icon">📈</div>
-                    <div>
-                        <div class="card-title">群聊统计概览</div>
-                        <div class="card-subtitle">数据统计摘要</div>
-                    </div>
-                    <div class="timestamp">{time.strftime('%H:%M')}</div>
-                </div>
-                
-                <div class="stats-grid">
-                    <div class="stat-card">
-                        <div class="stat-icon">💬</div>
-                        <div class="stat-value">{stats.get('total_messages', 0):,}</div>
-                        <div class="stat-label">总消息数</div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-icon">📅</div>
-                        <div class="stat-value">{stats.get('today_messages', 0):,}</div>
-                        <div class="stat-label">今日消息</div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-icon">👥</div>
-                        <div class="stat-value">{stats.get('total_users', 0):,}</div>
-                        <div class="stat-label">活跃用户</div>
-                    </div>
-                    <div class="stat-card">
-                        <div class="stat-icon">🖼️</div>
-                        <div class="stat-value">{stats.get('total_images', 0):,}</div>
-                        <div class="stat-label">图片总数</div>
-                    </div>
-                </div>
-                
-                <div class="footer-info">
-                    统计时间：{time.strftime('%Y-%m-%d %H:%M:%S')}
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        return html
+    def _stats_card(self, stats: Dict[str, Any]) -> str:
+        """生成统计概览卡片片段"""
+        return _render_card('stats', stats=stats, generated_at=_now_full())
     
-    async def generate_word_frequency(self, db_rows: List[Tuple], 
-                                      top_n: int = 15) -> Optional[io.BytesIO]:
-        """生成词频统计图"""
-        full_text = self.extract_text_from_messages(db_rows)
+    @property
+    def _use_lite_charts(self) -> bool:
+        """排行榜和活跃度图是否走 Pillow 绘制"""
+        return self.pillow_charts and self._lite.available
+    
+    async def _render_lite(self, method, *args) -> Optional[bytes]:
+        """在绘制线程池中调用 Pillow 绘制，失败时返回 None 由调用方回退到浏览器渲染"""
+        try:
+            async with self._render_semaphore:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._render_pool, method, *args)
+        except Exception as e:
+            logger.warning(f"Pillow 绘制失败，回退到浏览器渲染: {e}")
+            return None
+    
+    def _cached_image(self, key: bytes) -> Optional[bytes]:
+        """读取渲染缓存，未命中返回 None"""
+        return self._image_cache.get(key)
+    
+    def _remember_image(self, key: bytes, data: Optional[bytes]) -> Optional[bytes]:
+        """写入渲染缓存（渲染失败不缓存），原样返回 data"""
+        if data is not None:
+            self._image_cache.set(key, data)
+        return data
+    
+    @staticmethod
+    def _generate_page_html(page_head: str, cards: str) -> str:
+        """拼装完整页面：预拼接的页面头部 + 卡片片段"""
+        return page_head + cards + PAGE_TAIL
+    
+    async def _count_top_words(self, db_rows: List[Tuple], top_n: int) -> Optional[Tuple[List[Tuple], int]]:
+        """统计热词，返回 (top_words, 总词数)，无有效内容时返回 None"""
+        full_text = await asyncio.to_thread(self.extract_text_from_messages, db_rows)
         if not full_text:
             logger.warning("没有可分析的文本内容")
             return None
         
-        words = self.segment_text(full_text)
-        if not words:
+        # 相同语料直接复用上次的分词结果
+        key = hashlib.blake2b(full_text.encode('utf-8'), digest_size=16).digest()
+        cached = self._seg_cache.get(key)
+        if cached is None:
+            cached = await self._segment_counts(full_text)
+            self._seg_cache.set(key, cached)
+        word_counts, total_words = cached
+        
+        if not total_words:
             logger.warning("分词后没有有效词汇")
             return None
         
-        word_counts = Counter(words)
-        top_words = word_counts.most_common(top_n)
+        # 只取前 N 个，堆选择优于对全部词汇排序
+        top_words = nlargest(top_n, word_counts.items(), key=itemgetter(1))
         
         if not top_words:
             return None
+        return top_words, total_words
+    
+    @staticmethod
+    def _build_rank_data(user_stats: List[Tuple], user_names: Optional[Dict[int, str]],
+                         top_n: int, total_messages: Optional[int] = None,
+                         presorted: bool = True) -> Tuple[List[Dict], int, int]:
+        """
+        构建排行榜数据，返回 (前 top_n 名用户数据, 总消息数, 总参与人数)
+        
+        调用方已有总消息数（如 SQL 聚合结果）时直接传入 total_messages，省去重新求和；
+        user_stats 未按发言数降序排列时传 presorted=False，用堆选出前 top_n 名
+        """
+        user_names = user_names if user_names is not None else _EMPTY_NAMES
+        
+        # 计算总消息数和总用户数
+        if total_messages is None:
+            total_messages = sum(map(itemgetter(1), user_stats))
+        total_users = len(user_stats)  # 总参与人数
+        
+        # 构建用户数据列表（只取 top_n，islice 不复制切片）
+        top_stats = islice(user_stats, top_n) if presorted else nlargest(top_n, user_stats, key=itemgetter(1))
+        get_name, uid_str = user_names.get, str
+        users_data = [
+            {'user_id': user_id, 'count': count, 'nickname': get_name(user_id) or uid_str(user_id)}
+            for user_id, count in top_stats
+        ]
+        return users_data, total_messages, total_users
+    
+    async def generate_word_frequency(self, db_rows: List[Tuple], 
+                                      top_n: int = 15) -> Optional[bytes]:
+        """生成词频统计图"""
+        result = await self._count_top_words(db_rows, top_n)
+        if result is None:
+            return None
         
-        html = self._generate_word_frequency_html(top_words, len(words))
+        html = self._generate_page_html(WORD_FREQUENCY_PAGE, self._word_frequency_card(*result))
         return await html_to_image(html, width=600)
     
     async def generate_user_activity_chart(self, user_stats: List[Tuple],
                                            user_names: Dict[int, str] = None,
-                                           top_n: int = 10) -> Optional[io.BytesIO]:
+                                           top_n: int = 10,
+                                           total_messages: Optional[int] = None,
+                                           presorted: bool = True) -> Optional[bytes]:
         """
         生成用户排行榜图
         
@@ -916,51 +1278,133 @@ class StatsVisualizer:
             user_stats: [(user_id, count), ...]
             user_names: {user_id: nickname, ...} 用户昵称映射
             top_n: 显示前N名
+            total_messages: 总消息数，为 None 时由 user_stats 求和
+            presorted: user_stats 是否已按发言数降序排列（数据库查询结果已排序）
         """
         if not user_stats:
             return None
         
-        user_names = user_names or {}
+        users_data, total_messages, total_users = self._build_rank_data(
+            user_stats, user_names, top_n, total_messages, presorted
+        )
         
-        # 计算总消息数和总用户数
-        total_messages = sum(count for _, count in user_stats)
-        total_users = len(user_stats)  # 总参与人数
+        key = content_key(('rank', users_data, total_messages, total_users))
+        cached = self._cached_image(key)
+        if cached is not None:
+            return cached
         
-        # 构建用户数据列表（只取 top_n）
-        users_data = []
-        for user_id, count in user_stats[:top_n]:
-            users_data.append({
-                'user_id': user_id,
-                'count': count,
-                'nickname': user_names.get(user_id) or str(user_id)
-            })
+        if self._use_lite_charts:
+            user_ids = [u['user_id'] for u in users_data]
+            avatars = await asyncio.gather(*(avatar_cache.get(uid) for uid in user_ids))
+            image = await self._render_lite(
+                self._lite.render_rank, users_data, total_messages, total_users,
+                now(), dict(zip(user_ids, avatars))
+            )
+            if image is not None:
+                return self._remember_image(key, image)
         
-        html = self._generate_rank_html(users_data, total_messages, total_users)
-        return await html_to_image(html, width=550)
+        # 截图前预热头像缓存，页面加载时直接命中
+        await avatar_cache.prefetch(u['user_id'] for u in users_data)
+        
+        card = self._rank_card(users_data, total_messages, total_users)
+        html = self._generate_page_html(RANK_PAGE, card)
+        return self._remember_image(key, await html_to_image(html, width=550))
     
-    async def generate_hourly_activity_chart(self, hourly_counts: Dict[int, int]) -> Optional[io.BytesIO]:
+    async def generate_hourly_activity_chart(self, hourly_counts: Dict[int, int]) -> Optional[bytes]:
         """生成24小时活跃度图"""
         if not hourly_counts:
             return None
         
-        html = self._generate_hourly_html(hourly_counts)
-        return await html_to_image(html, width=800)
+        key = content_key(('hourly', sorted(hourly_counts.items())))
+        cached = self._cached_image(key)
+        if cached is not None:
+            return cached
+        
+        if self._use_lite_charts:
+            image = await self._render_lite(self._lite.render_hourly, hourly_counts, now())
+            if image is not None:
+                return self._remember_image(key, image)
+        
+        html = self._generate_page_html(HOURLY_PAGE, self._hourly_card(hourly_counts))
+        return self._remember_image(key, await html_to_image(html, width=800))
     
-    async def generate_stats_image(self, stats: Dict[str, Any]) -> Optional[io.BytesIO]:
+    async def generate_stats_image(self, stats: Dict[str, Any]) -> Optional[bytes]:
         """生成统计概览图"""
-        html = self._generate_stats_html(stats)
-        return await html_to_image(html, width=500)
+        key = content_key(('stats', stats))
+        cached = self._cached_image(key)
+        if cached is not None:
+            return cached
+        
+        if self._lite.available:
+            image = await self._render_lite(
+                self._lite.render_stats, stats,
+                now(), _now_full()
+            )
+            if image is not None:
+                return self._remember_image(key, image)
+        
+        html = self._generate_page_html(STATS_PAGE, self._stats_card(stats))
+        return self._remember_image(key, await html_to_image(html, width=500))
+    
+    async def generate_dashboard(self, db_rows: List[Tuple],
+                                 user_stats: List[Tuple],
+                                 user_names: Dict[int, str] = None,
+                                 hourly_counts: Dict[int, int] = None,
+                                 top_words: int = 15,
+                                 top_users: int = 10,
+                                 total_messages: Optional[int] = None) -> Optional[bytes]:
+        """
+        生成日报看板：热词、发言排行、24小时活跃度合并为一张图，只截图一次
+        
+        Args:
+            db_rows: 今日消息记录
+            user_stats: [(user_id, count), ...]
+            user_names: {user_id: nickname, ...} 用户昵称映射
+            hourly_counts: {hour: count, ...}
+            top_words: 热词数量
+            top_users: 排行榜人数
+            total_messages: 今日总消息数，为 None 时由 user_stats 求和
+        """
+        cards = []
+        
+        word_result = await self._count_top_words(db_rows, top_words) if db_rows else None
+        if word_result:
+            cards.append(self._word_frequency_card(*word_result))
+        
+        if user_stats:
+            users_data, total_messages, total_users = self._build_rank_data(
+                user_stats, user_names, top_users, total_messages
+            )
+            await avatar_cache.prefetch(u['user_id'] for u in users_data)
+            cards.append(self._rank_card(users_data, total_messages, total_users))
+        
+        if hourly_counts and any(hourly_counts.values()):
+            cards.append(self._hourly_card(hourly_counts))
+        
+        if not cards:
+            return None
+        
+        html = self._generate_page_html(DASHBOARD_PAGE, "\n".join(cards))
+        return await html_to_image(html, width=640)
     
     def generate_stats_summary(self, stats: Dict[str, Any]) -> str:
         """生成文字统计摘要（保留文字版本作为后备）"""
         lines = [
             "📈 群聊统计概览",
-            "─" * 20,
+            _HR,
             f"💬 总消息数: {stats.get('total_messages', 0):,}",
             f"📅 今日消息: {stats.get('today_messages', 0):,}",
             f"👥 活跃用户: {stats.get('total_users', 0):,}",
             f"🖼️ 图片总数: {stats.get('total_images', 0):,}",
-            "─" * 20,
-            f"⏱️ 统计时间: {time.strftime('%Y-%m-%d %H:%M:%S')}"
+            _HR,
+            f"⏱️ 统计时间: {_now_full()}"
         ]
         return "\n".join(lines)
+    
+    async def close(self):
+        """释放资源：关闭绘制线程池、分词进程池和截图浏览器"""
+        self._render_pool.shutdown(wait=False, cancel_futures=True)
+        if self._segment_pool is not None:
+            self._segment_pool.shutdown(wait=False, cancel_futures=True)
+            self._segment_pool = None
+        await close_browser()
@@ -13,30 +13,45 @@ QQ群聊数据统计机器人 - 主程序入口
 """
 
 import asyncio
-import json
 import logging
-import base64
+import queue
 import sys
 import time
+from bisect import bisect_right
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
+from urllib.parse import quote
 
 # 添加项目根目录到 Python 路径
 PROJECT_ROOT = Path(__file__).resolve().parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
 import websockets
+from websockets.asyncio.client import connect as ws_connect
 
 from config import settings
-from lib.db_manager import DatabaseManager
+from lib.db_manager import DatabaseManager, get_today_start
 from lib.async_utils import AssetDownloader
-from lib.visualizer import StatsVisualizer
-from lib.protocol import OneBotProtocol, MessageSegment, GroupMessage
+from lib.protocol import OneBotProtocol, MessageSegment, GroupMessage, extract_segment_texts
 from lib.commands import CommandRegistry, CommandContext, CommandInfo
 from lib.renderer import renderer
-from lib.nlp_analyzer import NLPAnalyzer
+from lib.cache import TTLCache
+from lib import fastjson
+
+# SIMD 加速的 Base64 编码（可选，接口与标准库一致）
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+# libuv 事件循环（可选，Windows 不支持）
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
 
 # 定时任务支持
 try:
@@ -46,8 +61,40 @@ except ImportError:
     SCHEDULER_AVAILABLE = False
 
 
+# 每帧 / 每行都会调用的解码函数，绑定到模块全局省去属性查找（orjson 可用时为 orjson.loads）
+_json_loads = fastjson.loads
+JSONDecodeError = fastjson.JSONDecodeError
+
+# 缓存未命中标记
+_MISSING = object()
+
+# 批量写入失败后重试前的等待时间（秒）
+WRITE_RETRY_DELAY = 0.5
+
+# 情感分数 -> (心情 emoji, 描述)：分数 >= 第 i 个阈值时取第 i + 1 项
+_MOOD_THRESHOLDS = (0.3, 0.45, 0.55, 0.7)
+_MOOD_TABLE = (
+    ("😢", "群聊氛围比较消极"),
+    ("😔", "群聊氛围有些低落"),
+    ("😐", "群聊氛围比较平和"),
+    ("😊", "群聊氛围较为正面"),
+    ("😄", "群聊氛围很积极！"),
+)
+
+
+# 日志后台写入线程，setup_logging 中启动
+_log_listener: Optional[QueueListener] = None
+
+
 def setup_logging():
-    """配置日志系统"""
+    """
+    配置日志系统
+    
+    根日志记录器只挂一个 QueueHandler，控制台输出和文件写入由 QueueListener
+    在后台线程完成，事件循环中记录日志不会阻塞在磁盘 I/O 上
+    """
+    global _log_listener
+    
     # 确保日志目录存在
     settings.LOG_DIR.mkdir(parents=True, exist_ok=True)
     
@@ -69,15 +116,26 @@ def setup_logging():
     file_handler.setFormatter(formatter)
     file_handler.setLevel(logging.DEBUG)
     
-    # 配置根日志记录器
+    # 配置根日志记录器（各处理器的级别由监听线程分别判断）
+    log_queue = queue.SimpleQueue()
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.DEBUG)
-    root_logger.addHandler(console_handler)
-    root_logger.addHandler(file_handler)
+    root_logger.addHandler(QueueHandler(log_queue))
+    
+    _log_listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _log_listener.start()
     
     return logging.getLogger("Main")
 
 
+def stop_logging():
+    """停止日志后台线程，写完队列中剩余的日志"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
 class QQStatBot:
     """QQ群聊数据统计机器人"""
     
@@ -90,12 +148,11 @@ class QQStatBot:
             settings.IMAGE_PATH, 
             max_concurrency=settings.MAX_DOWNLOAD_CONCURRENCY
         )
-        self.visualizer = StatsVisualizer(
-            font_path=settings.FONT_PATH,
-            stop_words=settings.STOP_WORDS
-        )
         self.protocol = OneBotProtocol()
-        self.nlp = NLPAnalyzer()  # NLP 分析器
+        # 可视化器和 NLP 分析器依赖较重（jieba、snownlp 等），首次使用时再创建
+        self._visualizer = None
+        self._nlp = None
+        renderer.font_path = settings.FONT_PATH  # 轻量渲染字体
         
         # 命令注册系统
         self.commands = CommandRegistry()
@@ -108,6 +165,33 @@ class QQStatBot:
         # 命令前缀
         self.cmd_prefix = "/"
         
+        # 监听群集合（为空表示监听所有群）
+        self._monitor_groups = frozenset(settings.MONITOR_GROUPS)
+        
+        # 消息写入队列：后台任务攒批后单事务写入，避免每条消息一次提交
+        self._msg_queue: asyncio.Queue = asyncio.Queue(
+            maxsize=getattr(settings, 'WRITE_QUEUE_SIZE', 10000)
+        )
+        self._pending_users: Dict[int, str] = {}  # 待写入的用户昵称（同一用户只保留最新）
+        self._write_batch_size = getattr(settings, 'WRITE_BATCH_SIZE', 500)
+        self._write_flush_interval = getattr(settings, 'WRITE_FLUSH_INTERVAL', 1.0)
+        self._writer_task: Optional[asyncio.Task] = None
+        self._warmup_task: Optional[asyncio.Task] = None  # 后台渲染器预热
+        
+        # 进行中的图片下载：file_id（无则 url）-> 下载任务
+        self._downloads_in_flight: Dict[str, asyncio.Task] = {}
+        # 最近已成功保存的图片：表情包反复出现时直接跳过，不再发起下载
+        self._recent_downloads = TTLCache(maxsize=2048, ttl=86400)
+        
+        # 用户昵称缓存：user_id -> 昵称（库中无记录时为 None），写入新昵称时同步更新
+        self._user_cache = TTLCache(maxsize=50000, ttl=300)
+        
+        # 报表图片缓存，键中带日期，跨天自然失效
+        self._stat_cache = TTLCache(maxsize=128, ttl=getattr(settings, 'STAT_CACHE_TTL', 300))
+        self._period_cache = TTLCache(maxsize=128, ttl=getattr(settings, 'PERIOD_CACHE_TTL', 3600))
+        # 周期热词缓存：(群号, 天数, 小时) -> 关键词，长周期语料一小时内变化很小
+        self._keyword_cache = TTLCache(maxsize=256, ttl=3600)
+        
         # 定时任务调度器
         self.scheduler = None
         if SCHEDULER_AVAILABLE:
@@ -116,6 +200,28 @@ class QQStatBot:
         
         self.logger.info("机器人初始化完成")
     
+    @property
+    def visualizer(self):
+        """统计图可视化器（首次访问时导入并创建）"""
+        if self._visualizer is None:
+            from lib.visualizer import StatsVisualizer, SEGMENT_WORKERS
+            self._visualizer = StatsVisualizer(
+                font_path=settings.FONT_PATH,
+                stop_words=settings.STOP_WORDS,
+                avatar_dir=settings.DATA_DIR / "avatars",
+                pillow_charts=getattr(settings, 'PILLOW_CHARTS', True),
+                segment_workers=getattr(settings, 'SEGMENT_WORKERS', SEGMENT_WORKERS)
+            )
+        return self._visualizer
+    
+    @property
+    def nlp(self):
+        """NLP 分析器（首次访问时导入并创建）"""
+        if self._nlp is None:
+            from lib.nlp_analyzer import NLPAnalyzer
+            self._nlp = NLPAnalyzer()
+        return self._nlp
+    
     def _setup_scheduler(self):
         """设置定时任务"""
         if not self.scheduler:
@@ -145,22 +251,31 @@ class QQStatBot:
     async def _scheduled_daily_report(self):
         """定时发送日报"""
         self.logger.info("执行定时日报任务")
-        for group_id in settings.MONITOR_GROUPS:
-            try:
-                await self._cmd_stat_impl(group_id)
-            except Exception as e:
-                self.logger.error(f"日报推送失败 (群 {group_id}): {e}")
-            await asyncio.sleep(2)  # 防止发送过快
+        await self._broadcast_report(self._cmd_stat_impl, "日报")
     
     async def _scheduled_weekly_report(self):
         """定时发送周报"""
         self.logger.info("执行定时周报任务")
-        for group_id in settings.MONITOR_GROUPS:
-            try:
-                await self._cmd_week_impl(group_id)
-            except Exception as e:
-                self.logger.error(f"周报推送失败 (群 {group_id}): {e}")
-            await asyncio.sleep(2)
+        await self._broadcast_report(self._cmd_week_impl, "周报")
+    
+    async def _broadcast_report(self, report_impl, report_name: str):
+        """
+        向所有监听群推送报告
+        
+        各群的生成互不依赖，限制并发数后同时进行；
+        每个名额发送完成后稍作停顿，防止发送过快
+        """
+        semaphore = asyncio.Semaphore(getattr(settings, 'REPORT_CONCURRENCY', 4))
+        
+        async def _one(group_id: int):
+            async with semaphore:
+                try:
+                    await report_impl(group_id)
+                except Exception as e:
+                    self.logger.error(f"{report_name}推送失败 (群 {group_id}): {e}")
+                await asyncio.sleep(0.5)
+        
+        await asyncio.gather(*(_one(group_id) for group_id in settings.MONITOR_GROUPS))
     
     def _register_commands(self):
         """注册所有命令"""
@@ -256,8 +371,6 @@ class QQStatBot:
     
     async def connect(self):
         """建立 WebSocket 连接"""
-        from urllib.parse import quote
-        
         uri = settings.WS_URI
         
         # 在 URI 中添加 token 参数（需要 URL 编码特殊字符）
@@ -268,10 +381,15 @@ class QQStatBot:
         
         self.logger.info(f"正在连接 {settings.WS_URI}...")
         
-        self.ws = await websockets.connect(
+        # 本机 / 内网连接瓶颈在 CPU 而非带宽，默认关闭 permessage-deflate，省去逐帧压缩解压
+        compression = "deflate" if getattr(settings, 'WS_COMPRESSION', False) else None
+        self.ws = await ws_connect(
             uri,
             ping_interval=settings.PING_INTERVAL,
-            ping_timeout=settings.PING_TIMEOUT
+            ping_timeout=settings.PING_TIMEOUT,
+            compression=compression,
+            max_size=getattr(settings, 'WS_MAX_SIZE', 4 * 1024 * 1024),
+            max_queue=getattr(settings, 'WS_MAX_QUEUE', 64)
         )
         
         self.logger.info("WebSocket 连接成功!")
@@ -283,37 +401,137 @@ class QQStatBot:
         user_id = msg.user_id
         
         # 检查是否在监听列表中
-        if settings.MONITOR_GROUPS and group_id not in settings.MONITOR_GROUPS:
+        if self._monitor_groups and group_id not in self._monitor_groups:
             return
         
-        # 1. 异步存储消息到数据库
+        # 1. 消息放入写入队列，由后台任务批量存储
         msg_data = {
             'message_id': msg.message_id,
             'group_id': group_id,
             'user_id': user_id,
-            'message': [seg.to_dict() for seg in msg.message],
+            'message': msg.raw_segments,  # 直接存储事件中已解析的原始消息段
             'time': msg.time
         }
-        asyncio.create_task(self.db.insert_message(msg_data))
+        try:
+            self._msg_queue.put_nowait(msg_data)
+        except asyncio.QueueFull:
+            self.logger.warning(f"消息写入队列已满，丢弃消息 {msg.message_id}")
         
-        # 2. 保存用户信息（昵称/群名片）
+        # 2. 保存用户信息（昵称/群名片），随下一批消息一起写入
         sender = msg.sender
         if sender:
             nickname = sender.get('card') or sender.get('nickname') or str(user_id)
-            asyncio.create_task(self.db.update_user_info(user_id, nickname))
+            self._pending_users[user_id] = nickname
         
         # 3. 处理图片下载
         for image in msg.get_images():
             url = image.get('url')
             file_id = image.get('file')
             if url:
-                asyncio.create_task(self._download_and_save_image(url, file_id))
+                self._schedule_image_download(url, file_id)
         
-        # 4. 处理命令
-        text = msg.get_plain_text()
-        if text.startswith(self.cmd_prefix):
+        # 4. 处理命令（绝大多数消息不是命令，先用首个文本段快速排除）
+        if msg.text_startswith(self.cmd_prefix):
+            text = msg.get_plain_text()
             await self._handle_command(msg, text[len(self.cmd_prefix):])
     
+    async def _batch_writer(self):
+        """
+        后台批量写入任务
+        
+        等到第一条消息后继续收集，直到达到批量上限或超过刷新间隔，
+        然后在一个事务里写入；收到 None 时写完剩余数据并退出
+        
+        队列中已有的消息用 get_nowait 直接取出，只有队列为空时才带超时等待，
+        避免每条消息都创建一次 wait_for 任务和定时器
+        """
+        loop = asyncio.get_running_loop()
+        msg_queue = self._msg_queue
+        stopping = False
+        while not stopping:
+            item = await msg_queue.get()
+            batch = []
+            if item is None:
+                stopping = True
+            else:
+                batch.append(item)
+                deadline = loop.time() + self._write_flush_interval
+                while len(batch) < self._write_batch_size:
+                    try:
+                        item = msg_queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            break
+                        try:
+                            item = await asyncio.wait_for(msg_queue.get(), remaining)
+                        except asyncio.TimeoutError:
+                            break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+            
+            await self._write_batch(batch)
+    
+    async def _write_batch(self, batch: List[dict]):
+        """写入一批消息及期间累积的用户信息"""
+        users, self._pending_users = self._pending_users, {}
+        if not batch and not users:
+            return
+        # 消息和昵称在同一事务中提交，每批只有一次线程切换和一次提交；
+        # 失败时事务整体回滚，短暂等待后重试一次（应对 database is locked 等瞬时错误）
+        for attempt in range(2):
+            try:
+                await self.db.write_batch(batch, list(users.items()))
+                break
+            except Exception as e:
+                if attempt == 0:
+                    self.logger.warning(f"批量写入失败，{WRITE_RETRY_DELAY}s 后重试: {e}")
+                    await asyncio.sleep(WRITE_RETRY_DELAY)
+                    continue
+                if batch:
+                    message_ids = [m['message_id'] for m in batch]
+                    self.logger.error(
+                        f"批量写入重试失败，丢弃 {len(batch)} 条消息 "
+                        f"(message_id {min(message_ids)}~{max(message_ids)}): {e}"
+                    )
+                else:
+                    self.logger.error(f"批量写入用户信息重试失败 ({len(users)} 个用户): {e}")
+                # 昵称放回待写入表随下一批重试（期间收到的更新昵称优先）
+                for user_id, nickname in users.items():
+                    self._pending_users.setdefault(user_id, nickname)
+                return
+        
+        # 提交成功后才更新缓存，避免缓存中出现未落库的昵称
+        for user_id, nickname in users.items():
+            self._user_cache.set(user_id, nickname)
+    
+    async def _resolve_users(self, user_ids) -> Dict[int, str]:
+        """
+        批量获取用户昵称（优先读缓存，只查询缓存中没有的用户）
+        
+        Returns:
+            {user_id: 昵称}，与 get_users_info_batch 一致，不包含库中没有记录的用户
+        """
+        result = {}
+        missing = []
+        for user_id in user_ids:
+            name = self._user_cache.get(user_id, _MISSING)
+            if name is _MISSING:
+                missing.append(user_id)
+            elif name is not None:
+                result[user_id] = name
+        
+        if missing:
+            fresh = await self.db.get_users_info_batch(missing)
+            for user_id in missing:
+                name = fresh.get(user_id)
+                self._user_cache.set(user_id, name)
+                if name is not None:
+                    result[user_id] = name
+        return result
+    
     async def handle_notice(self, notice: dict):
         """处理通知事件"""
         notice_type = notice.get('notice_type')
@@ -329,6 +547,19 @@ class QQStatBot:
                 await self.db.record_recall(group_id, user_id, int(time.time()))
                 self.logger.info(f"记录撤回: 群 {group_id}, 用户 {user_id}")
     
+    def _schedule_image_download(self, url: str, file_id: str):
+        """
+        后台下载图片；同一图片已在下载中或最近已保存时不再重复发起
+        
+        热门图片常被多人连续转发，合并为一次下载和一次入库
+        """
+        key = file_id or url
+        if key in self._downloads_in_flight or key in self._recent_downloads:
+            return
+        task = asyncio.create_task(self._download_and_save_image(url, file_id))
+        self._downloads_in_flight[key] = task
+        task.add_done_callback(lambda _: self._downloads_in_flight.pop(key, None))
+    
     async def _download_and_save_image(self, url: str, file_id: str):
         """下载并保存图片"""
         try:
@@ -341,13 +572,17 @@ class QQStatBot:
                     local_path=local_path,
                     size_bytes=size
                 )
+                # 只记录成功保存的图片，失败的下次出现时仍会重试
+                self._recent_downloads.set(file_id or url, True)
         except Exception as e:
             self.logger.error(f"保存图片失败: {e}")
     
     async def _handle_command(self, msg: GroupMessage, cmd: str):
         """处理机器人命令（使用命令注册系统）"""
         group_id = msg.group_id
-        cmd_parts = cmd.strip().split(maxsplit=1)
+        cmd_parts = cmd.split(maxsplit=1)
+        if not cmd_parts:
+            return
         cmd_name = cmd_parts[0].lower()
         args = cmd_parts[1] if len(cmd_parts) > 1 else ""
         
@@ -381,25 +616,27 @@ class QQStatBot:
     async def _cmd_stat_impl(self, group_id: int):
         """统计命令实现"""
         try:
-            # 获取今日消息
-            rows = await self.db.get_today_messages(group_id)
-            
-            if not rows:
-                await self.send_group_message(group_id, "📊 今日暂无消息记录")
-                return
-            
-            # 生成词频图 (异步)
-            img_buf = await self.visualizer.generate_word_frequency(
-                rows, 
-                top_n=settings.TOP_WORDS_COUNT
-            )
+            cache_key = (group_id, time.strftime('%Y-%m-%d'))
+            img_buf = self._stat_cache.get(cache_key)
+            if img_buf is None:
+                # 获取今日消息
+                rows = await self.db.get_today_messages(group_id)
+                
+                if not rows:
+                    await self.send_group_message(group_id, "📊 今日暂无消息记录")
+                    return
+                
+                # 生成词频图 (异步)
+                img_buf = await self.visualizer.generate_word_frequency(
+                    rows, 
+                    top_n=settings.TOP_WORDS_COUNT
+                )
+                if img_buf:
+                    self._stat_cache.set(cache_key, img_buf)
             
             if img_buf:
                 # Base64 编码并发送
-                b64_str = base64.b64encode(img_buf.getvalue()).decode()
-                await self.send_group_message(group_id, [
-                    MessageSegment.image_base64(b64_str)
-                ])
+                await self._send_image(group_id, img_buf)
             else:
                 await self.send_group_message(group_id, "📊 今日消息文本不足以生成统计图")
                 
@@ -412,23 +649,17 @@ class QQStatBot:
         group_id = ctx.group_id
         try:
             # 计算今日0点时间戳
-            now = time.time()
-            local_time = time.localtime(now)
-            today_start = int(time.mktime(time.struct_time((
-                local_time.tm_year, local_time.tm_mon, local_time.tm_mday,
-                0, 0, 0, 0, 0, -1
-            ))))
+            today_start = get_today_start()
             
-            user_stats = await self.db.get_user_message_count(group_id, today_start)
+            # 发言统计与前 10 名昵称一条 JOIN 查询取回
+            user_stats, user_names = await self.db.get_ranking_with_names(
+                group_id, today_start, name_limit=10
+            )
             
             if not user_stats:
                 await self.send_group_message(group_id, "👑 今日暂无发言记录")
                 return
             
-            # 获取用户昵称信息
-            user_ids = [uid for uid, _ in user_stats]
-            user_names = await self.db.get_users_info_batch(user_ids)
-            
             # 生成排行榜图 (异步)
             img_buf = await self.visualizer.generate_user_activity_chart(
                 user_stats, 
@@ -437,10 +668,7 @@ class QQStatBot:
             )
             
             if img_buf:
-                b64_str = base64.b64encode(img_buf.getvalue()).decode()
-                await self.send_group_message(group_id, [
-                    MessageSegment.image_base64(b64_str)
-                ])
+                await self._send_image(group_id, img_buf)
             else:
                 # 降级为文字版
                 lines = ["👑 今日发言排行榜：", "─" * 15]
@@ -457,12 +685,7 @@ class QQStatBot:
         """处理活跃度命令 - 生成24小时活跃度图"""
         group_id = ctx.group_id
         try:
-            now = time.time()
-            local_time = time.localtime(now)
-            today_start = int(time.mktime(time.struct_time((
-                local_time.tm_year, local_time.tm_mon, local_time.tm_mday,
-                0, 0, 0, 0, 0, -1
-            ))))
+            today_start = get_today_start()
             
             hourly_counts = await self.db.get_hourly_message_count(group_id, today_start)
             
@@ -474,10 +697,7 @@ class QQStatBot:
             img_buf = await self.visualizer.generate_hourly_activity_chart(hourly_counts)
             
             if img_buf:
-                b64_str = base64.b64encode(img_buf.getvalue()).decode()
-                await self.send_group_message(group_id, [
-                    MessageSegment.image_base64(b64_str)
-                ])
+                await self._send_image(group_id, img_buf)
             else:
                 await self.send_group_message(group_id, "❌ 生成活跃度图时出错")
                 
@@ -493,10 +713,7 @@ class QQStatBot:
             # 生成图片版统计
             img_buf = await self.visualizer.generate_stats_image(stats)
             if img_buf:
-                b64_str = base64.b64encode(img_buf.getvalue()).decode()
-                await self.send_group_message(group_id, [
-                    MessageSegment.image_base64(b64_str)
-                ])
+                await self._send_image(group_id, img_buf)
             else:
                 # 降级为文字版
                 summary = self.visualizer.generate_stats_summary(stats)
@@ -518,148 +735,105 @@ class QQStatBot:
     
     async def _cmd_week_impl(self, group_id: int):
         """周报实现"""
-        try:
-            # 获取最近 7 天数据
-            stats = await self.db.get_period_stats(group_id, days=7)
-            if stats['total_messages'] == 0:
-                await self.send_group_message(group_id, "📅 本周暂无消息记录")
-                return
-            
-            # 获取排行
-            user_ranking = await self.db.get_period_user_ranking(group_id, days=7, limit=10)
-            user_ids = [uid for uid, _ in user_ranking]
-            user_names = await self.db.get_users_info_batch(user_ids)
-            
-            total_msgs = stats['total_messages']
-            top_users = []
-            for uid, count in user_ranking:
-                top_users.append({
-                    'user_id': uid,
-                    'nickname': user_names.get(uid, str(uid)),
-                    'count': count,
-                    'percentage': (count / total_msgs * 100) if total_msgs > 0 else 0
-                })
-            
-            # 获取每日消息数
-            daily_counts = await self.db.get_period_daily_counts(group_id, days=7)
-            daily_stats = list(daily_counts.values())
-            
-            # 获取热词
-            messages = await self.db.get_period_messages(group_id, days=7)
-            texts = self._extract_texts(messages)
-            hot_words = self.nlp.extract_keywords_tfidf(texts, top_n=10)
-            
-            # 峰值日
-            if daily_counts:
-                peak_day = max(daily_counts.items(), key=lambda x: x[1])
-                peak_day_str = f"{peak_day[0]} ({peak_day[1]}条)"
-            else:
-                peak_day_str = "无"
-            
-            # 日期范围
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=6)
-            date_range = f"{start_date.strftime('%m/%d')} - {end_date.strftime('%m/%d')}"
-            
-            # 渲染图片
-            img_buf = await renderer.render_report(
-                period_type='week',
-                date_range=date_range,
-                total_messages=stats['total_messages'],
-                active_users=stats['active_users'],
-                daily_avg=stats['total_messages'] / 7,
-                peak_day=peak_day_str,
-                top_users=top_users,
-                daily_stats=daily_stats,
-                hot_words=hot_words,
-                image_count=stats.get('image_count', 0),
-                days=7
-            )
-            
-            if img_buf:
-                b64_str = base64.b64encode(img_buf.getvalue()).decode()
-                await self.send_group_message(group_id, [
-                    MessageSegment.image_base64(b64_str)
-                ])
-            else:
-                await self.send_group_message(group_id, "❌ 生成周报时出错")
-                
-        except Exception as e:
-            self.logger.error(f"生成周报失败: {e}", exc_info=True)
-            await self.send_group_message(group_id, "❌ 生成周报时出错")
+        await self._period_report_impl(group_id, 'week', 7)
     
     async def _cmd_month(self, ctx: CommandContext):
         """月报命令"""
-        group_id = ctx.group_id
+        await self._period_report_impl(ctx.group_id, 'month', 30)
+    
+    async def _period_report_impl(self, group_id: int, period_type: str, days: int):
+        """周报 / 月报实现，同一群同一天的报告在缓存有效期内直接复用"""
+        if period_type == 'week':
+            icon, period_name, report_name = '📅', '本周', '周报'
+        else:
+            icon, period_name, report_name = '📆', '本月', '月报'
+        
         try:
-            # 获取最近 30 天数据
-            stats = await self.db.get_period_stats(group_id, days=30)
-            if stats['total_messages'] == 0:
-                await self.send_group_message(group_id, "📆 本月暂无消息记录")
-                return
-            
-            # 获取排行
-            user_ranking = await self.db.get_period_user_ranking(group_id, days=30, limit=10)
-            user_ids = [uid for uid, _ in user_ranking]
-            user_names = await self.db.get_users_info_batch(user_ids)
-            
-            total_msgs = stats['total_messages']
-            top_users = []
-            for uid, count in user_ranking:
-                top_users.append({
-                    'user_id': uid,
-                    'nickname': user_names.get(uid, str(uid)),
-                    'count': count,
-                    'percentage': (count / total_msgs * 100) if total_msgs > 0 else 0
-                })
-            
-            # 获取每日消息数
-            daily_counts = await self.db.get_period_daily_counts(group_id, days=30)
-            daily_stats = list(daily_counts.values())
-            
-            # 获取热词
-            messages = await self.db.get_period_messages(group_id, days=30)
-            texts = self._extract_texts(messages)
-            hot_words = self.nlp.extract_keywords_tfidf(texts, top_n=10)
-            
-            # 峰值日
-            if daily_counts:
-                peak_day = max(daily_counts.items(), key=lambda x: x[1])
-                peak_day_str = f"{peak_day[0]} ({peak_day[1]}条)"
-            else:
-                peak_day_str = "无"
-            
-            # 日期范围
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=29)
-            date_range = f"{start_date.strftime('%m/%d')} - {end_date.strftime('%m/%d')}"
-            
-            # 渲染图片
-            img_buf = await renderer.render_report(
-                period_type='month',
-                date_range=date_range,
-                total_messages=stats['total_messages'],
-                active_users=stats['active_users'],
-                daily_avg=stats['total_messages'] / 30,
-                peak_day=peak_day_str,
-                top_users=top_users,
-                daily_stats=daily_stats,
-                hot_words=hot_words,
-                image_count=stats.get('image_count', 0),
-                days=30
-            )
+            cache_key = (period_type, group_id, time.strftime('%Y-%m-%d'))
+            img_buf = self._period_cache.get(cache_key)
+            if img_buf is None:
+                img_buf = await self._render_period_report(group_id, period_type, days)
+                if img_buf is None:
+                    await self.send_group_message(group_id, f"{icon} {period_name}暂无消息记录")
+                    return
+                if img_buf:
+                    self._period_cache.set(cache_key, img_buf)
             
             if img_buf:
-                b64_str = base64.b64encode(img_buf.getvalue()).decode()
-                await self.send_group_message(group_id, [
-                    MessageSegment.image_base64(b64_str)
-                ])
+                await self._send_image(group_id, img_buf)
             else:
-                await self.send_group_message(group_id, "❌ 生成月报时出错")
+                await self.send_group_message(group_id, f"❌ 生成{report_name}时出错")
                 
         except Exception as e:
-            self.logger.error(f"生成月报失败: {e}", exc_info=True)
-            await self.send_group_message(group_id, "❌ 生成月报时出错")
+            self.logger.error(f"生成{report_name}失败: {e}", exc_info=True)
+            await self.send_group_message(group_id, f"❌ 生成{report_name}时出错")
+    
+    async def _render_period_report(self, group_id: int, period_type: str, days: int) -> Optional[bytes]:
+        """
+        渲染周期报告图片
+        
+        Returns:
+            图片字节；期间没有消息时返回 None，渲染失败时返回空字节
+        """
+        # 获取最近 N 天数据
+        stats = await self.db.get_period_stats(group_id, days=days)
+        if stats['total_messages'] == 0:
+            return None
+        
+        # 获取排行
+        user_ranking = await self.db.get_period_user_ranking(group_id, days=days, limit=10)
+        user_ids = [uid for uid, _ in user_ranking]
+        user_names = await self._resolve_users(user_ids)
+        
+        total_msgs = stats['total_messages']
+        top_users = []
+        for uid, count in user_ranking:
+            top_users.append({
+                'user_id': uid,
+                'nickname': user_names.get(uid, str(uid)),
+                'count': count,
+                'percentage': (count / total_msgs * 100) if total_msgs > 0 else 0
+            })
+        
+        # 获取每日消息数
+        daily_counts = await self.db.get_period_daily_counts(group_id, days=days)
+        daily_stats = list(daily_counts.values())
+        
+        # 获取热词
+        keyword_key = (group_id, days, int(time.time() // 3600))
+        hot_words = self._keyword_cache.get(keyword_key)
+        if hot_words is None:
+            texts = await self.db.get_period_texts(group_id, days=days)
+            hot_words = await asyncio.to_thread(self.nlp.extract_keywords_tfidf, texts, 10)
+            self._keyword_cache.set(keyword_key, hot_words)
+        
+        # 峰值日
+        if daily_counts:
+            peak_day = max(daily_counts, key=daily_counts.__getitem__)
+            peak_day_str = f"{peak_day} ({daily_counts[peak_day]}条)"
+        else:
+            peak_day_str = "无"
+        
+        # 日期范围
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days - 1)
+        date_range = f"{start_date.strftime('%m/%d')} - {end_date.strftime('%m/%d')}"
+        
+        # 渲染图片
+        img_buf = await renderer.render_report(
+            period_type=period_type,
+            date_range=date_range,
+            total_messages=stats['total_messages'],
+            active_users=stats['active_users'],
+            daily_avg=stats['total_messages'] / days,
+            peak_day=peak_day_str,
+            top_users=top_users,
+            daily_stats=daily_stats,
+            hot_words=hot_words,
+            image_count=stats.get('image_count', 0),
+            days=days
+        )
+        return img_buf or b''
     
     async def _cmd_profile(self, ctx: CommandContext):
         """用户画像命令"""
@@ -680,7 +854,7 @@ class QQStatBot:
                 return
             
             # 获取昵称
-            user_info = await self.db.get_users_info_batch([target_user])
+            user_info = await self._resolve_users([target_user])
             nickname = user_info.get(target_user, str(target_user))
             
             # 获取小时分布
@@ -709,10 +883,7 @@ class QQStatBot:
             )
             
             if img_buf:
-                b64_str = base64.b64encode(img_buf.getvalue()).decode()
-                await self.send_group_message(group_id, [
-                    MessageSegment.image_base64(b64_str)
-                ])
+                await self._send_image(group_id, img_buf)
             else:
                 await self.send_group_message(group_id, "❌ 生成用户画像时出错")
                 
@@ -741,16 +912,7 @@ class QQStatBot:
             
             # 确定心情 emoji 和描述（SentimentResult 是 dataclass，用属性访问）
             score = sentiment_result.average_score
-            if score >= 0.7:
-                mood_emoji, mood_text = "😄", "群聊氛围很积极！"
-            elif score >= 0.55:
-                mood_emoji, mood_text = "😊", "群聊氛围较为正面"
-            elif score >= 0.45:
-                mood_emoji, mood_text = "😐", "群聊氛围比较平和"
-            elif score >= 0.3:
-                mood_emoji, mood_text = "😔", "群聊氛围有些低落"
-            else:
-                mood_emoji, mood_text = "😢", "群聊氛围比较消极"
+            mood_emoji, mood_text = _MOOD_TABLE[bisect_right(_MOOD_THRESHOLDS, score)]
             
             # 渲染图片
             img_buf = await renderer.render_sentiment(
@@ -766,10 +928,7 @@ class QQStatBot:
             )
             
             if img_buf:
-                b64_str = base64.b64encode(img_buf.getvalue()).decode()
-                await self.send_group_message(group_id, [
-                    MessageSegment.image_base64(b64_str)
-                ])
+                await self._send_image(group_id, img_buf)
             else:
                 await self.send_group_message(group_id, "❌ 生成情感分析时出错")
                 
@@ -790,25 +949,22 @@ class QQStatBot:
             # 提取消息列表 (text, user_id)
             messages_with_users = []
             for row in rows:
-                row_dict = dict(row) if hasattr(row, 'keys') else {'message': row[0], 'user_id': row[1] if len(row) > 1 else 0}
-                msg_content = row_dict.get('message', '')
-                user_id = row_dict.get('user_id', 0)
+                # 字典 / sqlite3.Row 直接按列名取值，普通元组按位置取值
+                try:
+                    msg_content, user_id = row['message'], row['user_id']
+                except (TypeError, IndexError, KeyError):
+                    msg_content, user_id = row[0], (row[1] if len(row) > 1 else 0)
                 
                 if isinstance(msg_content, str):
-                    try:
-                        msg_list = json.loads(msg_content)
-                    except:
-                        msg_list = [{'type': 'text', 'data': {'text': msg_content}}]
+                    text = ''.join(extract_segment_texts(msg_content)).strip()
                 else:
-                    msg_list = msg_content
-                
-                text = ''
-                for seg in msg_list:
-                    if isinstance(seg, dict) and seg.get('type') == 'text':
-                        text += seg.get('data', {}).get('text', '')
-                
-                if text.strip():
-                    messages_with_users.append((text.strip(), user_id))
+                    text = ''.join(
+                        seg.get('data', {}).get('text', '')
+                        for seg in msg_content
+                        if isinstance(seg, dict) and seg.get('type') == 'text'
+                    ).strip()
+                if text:
+                    messages_with_users.append((text, user_id))
             
             if len(messages_with_users) < 5:
                 await self.send_group_message(group_id, "🔁 今日消息不足以检测复读")
@@ -825,7 +981,7 @@ class QQStatBot:
             all_users = set()
             for r in repeats:
                 all_users.update(r.get('users', []))
-            user_names = await self.db.get_users_info_batch(list(all_users))
+            user_names = await self._resolve_users(all_users)
             
             # 为每个复读添加用户昵称
             for r in repeats:
@@ -838,10 +994,7 @@ class QQStatBot:
             )
             
             if img_buf:
-                b64_str = base64.b64encode(img_buf.getvalue()).decode()
-                await self.send_group_message(group_id, [
-                    MessageSegment.image_base64(b64_str)
-                ])
+                await self._send_image(group_id, img_buf)
             else:
                 await self.send_group_message(group_id, "❌ 生成复读机报告时出错")
                 
@@ -860,15 +1013,12 @@ class QQStatBot:
                 return
             
             user_ids = [uid for uid, _ in ranking]
-            user_names = await self.db.get_users_info_batch(user_ids)
+            user_names = await self._resolve_users(user_ids)
             
             # 渲染为图片并发送
             image_buffer = await renderer.render_recall(ranking, user_names, days=7)
             if image_buffer:
-                b64_str = base64.b64encode(image_buffer.getvalue()).decode()
-                await self.send_group_message(group_id, [
-                    MessageSegment.image_base64(b64_str)
-                ])
+                await self._send_image(group_id, image_buffer)
             else:
                 # 降级为文本输出
                 lines = ["🗑️ 撤回消息排行 (最近7天)：", "─" * 18]
@@ -884,8 +1034,14 @@ class QQStatBot:
     # ==================== 辅助方法 ====================
     
     def _extract_texts(self, rows) -> List[str]:
-        """从消息行中提取文本"""
+        """
+        从消息行中提取文本
+        
+        存储的消息段 JSON 交给 extract_segment_texts 用预编译正则直接取出文本段，
+        不再逐行完整解析 JSON 再遍历消息段
+        """
         texts = []
+        append = texts.append
         for row in rows:
             # 处理 sqlite Row 对象或普通元组
             if hasattr(row, 'keys'):
@@ -894,18 +1050,18 @@ class QQStatBot:
                 msg_content = row[0] if row else ''
             
             if isinstance(msg_content, str):
-                try:
-                    msg_list = json.loads(msg_content)
-                except:
-                    msg_list = [{'type': 'text', 'data': {'text': msg_content}}]
+                segment_texts = extract_segment_texts(msg_content)
             else:
-                msg_list = msg_content
+                segment_texts = [
+                    seg.get('data', {}).get('text', '')
+                    for seg in msg_content
+                    if isinstance(seg, dict) and seg.get('type') == 'text'
+                ]
             
-            for seg in msg_list:
-                if isinstance(seg, dict) and seg.get('type') == 'text':
-                    text = seg.get('data', {}).get('text', '').strip()
-                    if text and len(text) > 1:
-                        texts.append(text)
+            for text in segment_texts:
+                text = text.strip()
+                if len(text) > 1:
+                    append(text)
         return texts
     
     def _calculate_badges(self, user_stats: dict, hourly_stats: dict) -> List[Dict]:
@@ -925,12 +1081,12 @@ class QQStatBot:
         
         # 时间段徽章
         if hourly_stats:
-            night_msgs = sum(hourly_stats.get(h, 0) for h in range(0, 6))
-            morning_msgs = sum(hourly_stats.get(h, 0) for h in range(6, 12))
-            afternoon_msgs = sum(hourly_stats.get(h, 0) for h in range(12, 18))
-            evening_msgs = sum(hourly_stats.get(h, 0) for h in range(18, 24))
+            # 先展开为 24 长度列表，时间段统计只需切片求和
+            hours = [hourly_stats.get(h, 0) for h in range(24)]
+            night_msgs = sum(hours[0:6])
+            morning_msgs = sum(hours[6:12])
             
-            total_hourly = sum(hourly_stats.values())
+            total_hourly = sum(hours)
             if total_hourly > 0:
                 if night_msgs / total_hourly > 0.3:
                     badges.append({'icon': '🌙', 'name': '夜猫子', 'desc': '深夜活跃'})
@@ -962,10 +1118,22 @@ class QQStatBot:
             self.logger.error("WebSocket 未连接")
             return
         
-        payload = self.protocol.build_send_group_msg(group_id, message)
-        await self.ws.send(payload)
+        payload = self.protocol.build_send_group_msg_bytes(group_id, message)
+        # OneBot 只接受文本帧，UTF-8 字节以 text=True 原样发送
+        await self.ws.send(payload, text=True)
         self.logger.debug(f"发送群消息: {group_id}")
     
+    async def _send_image(self, group_id: int, img_buf: bytes):
+        """以 Base64 图片消息段发送 PNG 字节"""
+        if self.ws is None:
+            self.logger.error("WebSocket 未连接")
+            return
+        
+        payload = self.protocol.build_send_group_image(group_id, base64.b64encode(img_buf))
+        # 以文本帧发送 UTF-8 字节，websockets 不再做 str -> bytes 编码
+        await self.ws.send(payload, text=True)
+        self.logger.debug(f"发送群图片: {group_id}")
+    
     async def dispatch_event(self, data: dict):
         """分发事件到对应的处理器"""
         # 处理通知事件
@@ -974,6 +1142,12 @@ class QQStatBot:
             await self.handle_notice(data)
             return
         
+        # 未监听群的消息在解析前直接丢弃，只需一次集合查找
+        if (post_type == 'message' and self._monitor_groups
+                and data.get('message_type') == 'group'
+                and data.get('group_id') not in self._monitor_groups):
+            return
+        
         event = self.protocol.parse_event(data)
         
         if event is None:
@@ -1002,16 +1176,26 @@ class QQStatBot:
             self.scheduler.start()
             self.logger.info("定时任务调度器已启动")
         
+        # 后台预热渲染器，不阻塞 WebSocket 连接；关闭预热时首次出图才启动浏览器
+        if getattr(settings, 'RENDER_WARMUP', True):
+            self._warmup_task = asyncio.create_task(renderer.warmup())
+        
+        # 启动消息批量写入任务（重连时复用，不随连接重启）
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._batch_writer())
+        
         while True:
             try:
                 await self.connect()
                 
-                async for message in self.ws:
+                while True:
+                    # 文本帧直接取原始 UTF-8 字节交给 JSON 解析，省去解码成 str 的拷贝
+                    message = await self.ws.recv(decode=False)
                     try:
-                        data = json.loads(message)
+                        data = _json_loads(message)
                         await self.dispatch_event(data)
-                    except json.JSONDecodeError:
-                        self.logger.warning(f"无效的 JSON 数据: {message[:100]}")
+                    except JSONDecodeError:
+                        self.logger.warning(f"无效的 JSON 数据: {message[:100]!r}")
                     except Exception as e:
                         self.logger.error(f"处理消息时出错: {e}", exc_info=True)
                         
@@ -1038,12 +1222,35 @@ class QQStatBot:
             except Exception:
                 pass
         
+        # 先停止仍在进行的预热，避免关闭后又启动浏览器
+        if self._warmup_task and not self._warmup_task.done():
+            self._warmup_task.cancel()
+            try:
+                await self._warmup_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        
         # 关闭渲染器
         try:
             await renderer.close()
         except Exception:
             pass
         
+        # 关闭可视化器（绘制线程池 + 截图浏览器），未创建过则跳过
+        if self._visualizer is not None:
+            try:
+                await self._visualizer.close()
+            except Exception:
+                pass
+        
+        # 写完队列中剩余的消息
+        if self._writer_task and not self._writer_task.done():
+            try:
+                await self._msg_queue.put(None)
+                await asyncio.wait_for(self._writer_task, timeout=10)
+            except Exception:
+                pass
+        
         # 关闭数据库
         try:
             await self.db.close()
@@ -1059,6 +1266,8 @@ async def main():
     logger.info("=" * 50)
     logger.info("QQ群聊数据统计机器人启动")
     logger.info("=" * 50)
+    if UVLOOP_AVAILABLE:
+        logger.info("使用 uvloop 事件循环")
     
     bot = QQStatBot()
     
@@ -1070,14 +1279,18 @@ async def main():
         pass
     finally:
         await bot.shutdown()
+        stop_logging()
 
 
 if __name__ == "__main__":
     import warnings
     warnings.filterwarnings("ignore")  # 屏蔽警告
     
+    # uvloop.run 直接创建 libuv 事件循环，无需设置（3.12 起已弃用的）事件循环策略
+    run = uvloop.run if UVLOOP_AVAILABLE else asyncio.run
+    
     try:
-        asyncio.run(main())
+        run(main())
     except KeyboardInterrupt:
         pass  # 静默退出
     except SystemExit: